@@ -1,4 +1,5 @@
 import os
+import json
 import logging
 
 import uvicorn
@@ -10,10 +11,11 @@ import argparse
 from fastapi.openapi.utils import get_openapi
 from fastapi import FastAPI, UploadFile, File 
 from fastapi import Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from utilities.tags import docs_meta_tags
+from database.db_pool import ConnectionPool
 
 worker = None
 app = FastAPI()
@@ -48,6 +50,7 @@ AZURE_SQL_SERVER = os.getenv("AZURE_SQL_SERVER")
 AZURE_SQL_DATABASE = os.getenv("AZURE_SQL_DATABASE")
 AZURE_SQL_USERNAME = os.getenv("AZURE_SQL_USERNAME")
 AZURE_SQL_PASSWORD = os.getenv("AZURE_SQL_PASSWORD")
+AZURE_SQL_POOL_SIZE = int(os.getenv("AZURE_SQL_POOL_SIZE", 10))
 
 # Function to establish a connection using pymssql
 def get_db_connection():
@@ -64,56 +67,70 @@ def get_db_connection():
         print(f"❌ Connection failed: {e}")
         return None
 
+def print_db_version(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT @@VERSION;")
+        row = cursor.fetchone()
+        while row:
+            print(row[0])
+            row = cursor.fetchone()
+
 @app.on_event("startup")
 def startup_db_client():
-    conn = get_db_connection()
-    if conn:
-        app.state.db = conn  # Store connection in app state
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT @@VERSION;")
-            row = cursor.fetchone()
-            while row:
-                print(row[0])
-                row = cursor.fetchone()
+    pool = ConnectionPool(get_db_connection, size=AZURE_SQL_POOL_SIZE)
+    app.state.db = pool  # Store connection pool in app state
+    try:
+        pool.run_sync(print_db_version)
+    except HTTPException as e:
+        print(f"❌ {e.detail}")
 
 @app.on_event("shutdown")
 def shutdown_db_client():
-    conn = app.state.db
-    if conn:
-        conn.close()
-        print("🔌 Database connection closed")
+    pool = app.state.db
+    if pool:
+        pool.close()
+        print("🔌 Database connection pool closed")
 
 @app.get("/", tags=["Default"])
 async def index():
     return {"message": "Backend Server Running"}
 
-@app.get("/test-db")
-def test_db():
-    conn = app.state.db
-    if not conn:
-        return {"Error": "Database connection is not available"}
-
+def first_table_name(conn):
     with conn.cursor() as cursor:
         cursor.execute("SELECT TOP 1 name FROM sys.tables;")
         row = cursor.fetchone()
-        return {"table_name": row[0] if row else "No tables found"}
+        return row[0] if row else "No tables found"
 
+@app.get("/test-db")
+async def test_db():
+    pool = app.state.db
+    try:
+        table_name = await pool.run(first_table_name)
+    except HTTPException as e:
+        return {"Error": e.detail}
+    return {"table_name": table_name, "pool": pool.stats()}
 
 
+
+from typing import List
 from pydantic import BaseModel, Field
 
 from web.web_worker import WebWorker
 from pdf_parser.pdf_worker import ParserWorker
 from llm.llm_worker import LLMGenerator
 from database.db_worker import (
-    insert_drug_record,
     prescription_file_content,
-    insert_patient_drug_recommendation
+    prescription_files_content,
+    insert_prescription_records
 )
 from database.db_processing import (
     postprocess_drug_db
 )
 from web.application_utils.schema_models import WebSearchModel
+from utilities.utils import load_configurations
+from utilities.cache_utils import DrugInfoCache, DocumentCache
+from utilities.job_queue import JobManager
+from utilities.async_utils import StageLimiter, http_clients
 
 class PrescriptionRequestModel(BaseModel):
     personId: int = Field(default=1)
@@ -121,65 +138,229 @@ class PrescriptionRequestModel(BaseModel):
     prescriptionId: int = Field(default=4)
 
 
+class PrescriptionBatchRequestModel(BaseModel):
+    prescriptions: List[PrescriptionRequestModel] = Field(default=[PrescriptionRequestModel()])
+
+
 class BaseWorker:
     def __init__(
         self,
         current_work_dir: str,
         parser_type: str,
-        azure_version: str
+        azure_version: str,
+        job_workers: int = 4,
+        job_queue_size: int = 100
     ):
         global worker
-        self.web_worker = WebWorker(cwd=current_work_dir)
-        self.pdf_worker = ParserWorker(parser_type=parser_type, azure_version=azure_version, cwd=current_work_dir)
+        self.configurations = load_configurations(current_work_dir)
+        # Shared by every request so batches and concurrent calls respect the same per-stage limits
+        self.stage_limits = StageLimiter(self.configurations.get("concurrency_configurations", {}))
+        http_clients.configure(**self.configurations.get("http_configurations", {}))
+
+        cache_config = self.configurations.get("cache_configurations", {})
+        self.drug_cache = DrugInfoCache(current_work_dir, cache_config.get("drug_info", {}))
+        self.document_cache = DocumentCache(current_work_dir, cache_config.get("documents", {}))
+
+        self.web_worker = WebWorker(cwd=current_work_dir, stage_limits=self.stage_limits)
+        self.pdf_worker = ParserWorker(
+            parser_type=parser_type,
+            azure_version=azure_version,
+            cwd=current_work_dir,
+            document_cache=self.document_cache,
+            stage_limits=self.stage_limits,
+            config=self.configurations.get("pdf_configurations", {})
+        )
         self.llm_worker = LLMGenerator(cwd=current_work_dir)
+
+        self.job_manager = JobManager(handler=self.run_job, num_workers=job_workers, max_queue_size=job_queue_size)
         
         worker = self
     
     async def fetch_and_process(self, drug_name, query):
         output = await self.web_worker.execute_web_retrieve(WebSearchModel(query_text=query))
+        return await self.answer_from_web_output(output)
+
+    async def answer_from_web_output(self, output):
         query_and_chunks, urls_string = self.web_worker.chunks_and_urls(output)
         response = await self.llm_worker.execute_llm(query_and_chunks, "clean_scraped")
-        return response + urls_string
-
-    async def process_drug_info(self, drug_name):
-        side_effects_task = self.fetch_and_process(drug_name, f"What are the side effects of {drug_name}?")
-        drug_purpose_task = self.fetch_and_process(drug_name, f"What is the purpose of {drug_name}?")
-        drug_recommendation_task = self.fetch_and_process(drug_name, f"What is the consumption recommendation for {drug_name}?")
-        diet_recommendation_task = self.fetch_and_process(drug_name, f"What is the diet recommendation while taking {drug_name}?")
+        return response, urls_string
 
-        side_effects, drug_purpose, drug_recommendation, diet_recommendation = await asyncio.gather(
-            side_effects_task, drug_purpose_task, drug_recommendation_task, diet_recommendation_task
-        )
+    async def fetch_and_process_dossier(self, drug_name, questions, keywords):
+        outputs = await self.web_worker.execute_dossier_retrieve(drug_name, questions, keywords)
+        return await asyncio.gather(*[self.answer_from_web_output(output) for output in outputs])
 
-        return side_effects, drug_purpose, drug_recommendation, diet_recommendation
+    async def process_drug_info(self, drug_name):
+        cache_key = self.drug_cache.normalize_key(drug_name)
+        if not cache_key:
+            drug_info, _ = await self.limited_drug_info(drug_name)
+        else:
+            # Concurrent prescriptions naming the same drug share one lookup
+            drug_info = await self.drug_cache.get_or_compute(cache_key, lambda: self.limited_drug_info(drug_name))
+        return tuple(drug_info[field] for field in DrugInfoCache.FIELDS)
+
+    async def fetch_drug_info(self, drug_name):
+        """The four recommendation fields of a drug from web search and the LLM, and whether to cache them."""
+        questions = [
+            f"What are the side effects of {drug_name}?",
+            f"What is the purpose of {drug_name}?",
+            f"What is the consumption recommendation for {drug_name}?",
+            f"What is the diet recommendation while taking {drug_name}?"
+        ]
+        if self.web_worker.dossier_mode:
+            # Sentences of the shared corpus are matched by topic keywords, not by the question wording
+            keywords = [
+                f"{drug_name} side effects",
+                f"{drug_name} used treat",
+                f"{drug_name} dose daily",
+                f"{drug_name} diet food alcohol"
+            ]
+            results = await self.fetch_and_process_dossier(drug_name, questions, keywords)
+        else:
+            results = await asyncio.gather(*[self.fetch_and_process(drug_name, question) for question in questions])
+        drug_info = dict(zip(DrugInfoCache.FIELDS, [response + urls_string for response, urls_string in results]))
+
+        # Only complete answers are cached, a failed LLM call should be retried next time
+        return drug_info, all(response for response, _ in results)
+
+    async def limited_drug_info(self, drug_name):
+        # Only the lookup holds a slot, not the callers waiting on a shared one
+        async with self.stage_limits("drug_info"):
+            return await self.fetch_drug_info(drug_name)
+
+    async def execute_worker(self, db_pool, request):
+        try:
+            file_content = await db_pool.run(prescription_file_content, int(request.prescriptionId))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid prescription ID format")
+        return await self.execute_pipeline(db_pool, request, file_content)
 
-    async def execute_worker(self, conn, request):
+    async def extract_drugs(self, file_content, hash_code):
+        """extract_info output of a prescription PDF, and whether to cache it: only an extraction that yielded drugs is."""
+        async with self.stage_limits("pdf_parse"):
+            output = await self.pdf_worker.execute_parse_text(file_content, hash_code)
+        async with self.stage_limits("llm_extract"):
+            output = await self.llm_worker.execute_llm(output, "extract_info")
+        return output, bool(postprocess_drug_db(output))
+
+    async def execute_pipeline(self, db_pool, request, file_content):
+        drug_records, output = await self.prepare_records(request, file_content)
+        await db_pool.run(insert_prescription_records, drug_records, output["recommendation_data"])
+        return output
+
+    async def prepare_records(self, request, file_content):
+        """
+        Everything of the pipeline up to the database write: the drug records of the prescription
+        and the output, whose recommendation_data are the recommendation records.
+        """
         prescription_id = request.prescriptionId
         visit_occurrence_id = request.visitOccurrenceId
         person_id = request.personId
         try:
-            file_content = prescription_file_content(conn, int(prescription_id))
-            output = await self.pdf_worker.execute_parse_text(file_content)
-            output = await self.llm_worker.execute_llm(output, "extract_info")
+            # Byte-identical PDFs skip OCR, and the extraction too while model and prompt are unchanged
+            hash_code = self.pdf_worker.generate_hash_key(file_content)
+            if self.document_cache.cache_extract_info:
+                extract_key = self.document_cache.extract_key(hash_code, self.llm_worker.prompt_version("extract_info"))
+                # Concurrent requests for the same document share one extraction
+                output = await self.document_cache.get_or_compute(extract_key, lambda: self.extract_drugs(file_content, hash_code))
+            else:
+                output, _ = await self.extract_drugs(file_content, hash_code)
             drug_table = postprocess_drug_db(output)
-            
-            insert_drug_record(conn, prescription_id, person_id, visit_occurrence_id, drug_table)
-            drug_name = drug_table.get("drug_name")
-            
-            recommendation_data = {}
-            recommendation_data["side_effects"], recommendation_data["drug_purpose"], recommendation_data["drug_consumption_pattern"], recommendation_data["dietary_recommendation"] = await self.process_drug_info(drug_name)
-            recommendation_data["person_id"] = person_id
-            recommendation_data["prescription_id"] = prescription_id
-            recommendation_data["visit_occurrence_id"] = visit_occurrence_id
-            insert_patient_drug_recommendation(conn, recommendation_data)
+            if not drug_table:
+                raise HTTPException(status_code=422, detail="No drugs could be extracted from the prescription")
+
+            # One set of recommendations per distinct drug, fetched concurrently
+            drug_names = {}
+            for drug_data in drug_table:
+                drug_names.setdefault(DrugInfoCache.normalize_key(drug_data["drug_name"]), drug_data["drug_name"])
+            drug_infos = await asyncio.gather(*[self.process_drug_info(drug_name) for drug_name in drug_names.values()])
+
+            recommendations = []
+            for drug_name, drug_info in zip(drug_names.values(), drug_infos):
+                recommendation_data = dict(zip(DrugInfoCache.FIELDS, drug_info))
+                recommendation_data["drug_name"] = drug_name
+                recommendation_data["person_id"] = person_id
+                recommendation_data["prescription_id"] = prescription_id
+                recommendation_data["visit_occurrence_id"] = visit_occurrence_id
+                recommendations.append(recommendation_data)
+
+            drug_records = [(prescription_id, person_id, visit_occurrence_id, drug_data) for drug_data in drug_table]
             output = {
                 "drug_table": drug_table,
-                "recommendation_data": recommendation_data
+                "recommendation_data": recommendations
             }
-            return output
+            return drug_records, output
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid prescription ID format")
 
+    async def run_job(self, request):
+        return await self.execute_worker(app.state.db, request)
+
+    async def fetch_batch_files(self, db_pool, requests):
+        """All blobs of the batch with one query, {prescription id: file content}."""
+        return await db_pool.run(prescription_files_content, [int(request.prescriptionId) for request in requests])
+
+    async def execute_batch(self, db_pool, requests, files):
+        """
+        Runs the pipeline for every prescription of the batch concurrently, with the blobs
+        from fetch_batch_files. Prescriptions that finish while a write is running are written
+        together in the next transaction; each result is yielded once it is written.
+        """
+
+        async def run_item(request):
+            item = {
+                "personId": request.personId,
+                "visitOccurrenceId": request.visitOccurrenceId,
+                "prescriptionId": request.prescriptionId
+            }
+            try:
+                file_content = files.get(int(request.prescriptionId))
+                if file_content is None:
+                    raise HTTPException(status_code=404, detail="Prescription not found")
+                return item, await self.prepare_records(request, file_content)
+            except HTTPException as e:
+                item["status"], item["error"] = "failed", e.detail
+            except Exception as e:
+                print(f"Custom Exception func(execute_batch) prescription {request.prescriptionId}: {e}")
+                item["status"], item["error"] = "failed", str(e)
+            return item, None
+
+        pending = {asyncio.create_task(run_item(request)) for request in requests}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished = [task.result() for task in done]
+                await self.write_batch(db_pool, [(item, records) for item, records in finished if records is not None])
+                for item, _ in finished:
+                    yield item
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def write_batch(self, db_pool, prepared):
+        """
+        Writes the records of several prescriptions in one transaction. If it fails, every
+        prescription is written on its own, so one bad prescription does not fail the others.
+        """
+        if not prepared:
+            return
+        try:
+            await db_pool.run(
+                insert_prescription_records,
+                [drug_record for _, (drug_records, _) in prepared for drug_record in drug_records],
+                [recommendation for _, (_, output) in prepared for recommendation in output["recommendation_data"]]
+            )
+        except HTTPException as e:
+            if len(prepared) == 1:
+                item, _ = prepared[0]
+                item["status"], item["error"] = "failed", e.detail
+                return
+            for single in prepared:
+                await self.write_batch(db_pool, [single])
+            return
+        for item, (_, output) in prepared:
+            item["result"] = output
+            item["status"] = "completed"
+
 
 @app.get("/", tags=["Default"])
 async def index():
@@ -187,11 +368,64 @@ async def index():
 
 @app.post("/run-worker", tags=["Default"])
 async def fetch_prescription_file(request: PrescriptionRequestModel):
-    conn = app.state.db
-    result = await worker.execute_worker(conn, request)
+    db_pool = app.state.db
+    result = await worker.execute_worker(db_pool, request)
 
     return JSONResponse(result)
 
+@app.post("/run-worker/batch", tags=["Default"])
+async def fetch_prescription_batch(request: PrescriptionBatchRequestModel):
+    db_pool = app.state.db
+    # Fetched before the response starts, so a database failure is still an HTTP error status
+    files = await worker.fetch_batch_files(db_pool, request.prescriptions)
+
+    async def stream_results():
+        async for item in worker.execute_batch(db_pool, request.prescriptions, files):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/run-worker/jobs", tags=["Default"], status_code=202)
+async def submit_prescription_job(request: PrescriptionRequestModel):
+    job = worker.job_manager.submit(request)
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@app.get("/jobs/{job_id}", tags=["Default"])
+async def get_prescription_job(job_id: str):
+    return worker.job_manager.get(job_id)
+
+@app.on_event("startup")
+async def startup_job_manager():
+    await http_clients.start()
+    if worker:
+        await worker.job_manager.start()
+        await worker.web_worker.start()
+
+@app.on_event("shutdown")
+async def shutdown_job_manager():
+    if worker:
+        await worker.job_manager.stop()
+        await worker.llm_worker.aclose()
+        worker.web_worker.close()
+        worker.pdf_worker.close()
+    await http_clients.aclose()
+
+@app.get("/http-stats", tags=["Default"])
+async def http_stats():
+    return http_clients.stats()
+
+@app.get("/cache-stats", tags=["Default"])
+async def cache_stats():
+    return {"drug_info": worker.drug_cache.stats(), "documents": worker.document_cache.stats(), "web": worker.web_worker.stats()}
+
+@app.get("/pdf-stats", tags=["Default"])
+async def pdf_stats():
+    return worker.pdf_worker.stats()
+
+@app.get("/llm-stats", tags=["Default"])
+async def llm_stats():
+    return worker.llm_worker.stats()
+
 if __name__ == "__main__":
     # Argument parser for host and port
     parser = argparse.ArgumentParser()
@@ -200,6 +434,8 @@ if __name__ == "__main__":
 
     parser.add_argument("--parser_type", type=str, default="azure")
     parser.add_argument( "--azure_version", type=str, default="V4")
+    parser.add_argument("--job_workers", type=int, default=4, help="Number of pipelines run concurrently by the job queue")
+    parser.add_argument("--job_queue_size", type=int, default=100, help="Maximum number of queued jobs")
 
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
@@ -208,7 +444,9 @@ if __name__ == "__main__":
     worker = BaseWorker(
         current_work_dir,
         args.parser_type,
-        args.azure_version
+        args.azure_version,
+        args.job_workers,
+        args.job_queue_size
     )
 
     uvicorn.run(app, host=args.host, port=args.port, log_level=logging.INFO)
\ No newline at end of file
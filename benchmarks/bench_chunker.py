@@ -0,0 +1,124 @@
+"""
+Benchmark of the streaming CreateChunks.iter_chunks against the original chunker
+(get_number_of_chunks + split_text_into_parts), on pages of 100 KB and more built from
+the scraped WebMD / PubMed samples in benchmarks/data.
+
+Checks on every page:
+- every chunk the original chunker produced is produced, in order, with the same boundaries;
+- the original stopped after get_number_of_chunks - 1 chunks and dropped the rest of the
+  page, the streaming chunker keeps cutting with the same rule until the page is covered.
+
+Run from the repository root:
+    python -m benchmarks.bench_chunker
+"""
+import os
+import re
+import math
+import time
+import random
+
+from web.search_utils.scrape_data import CreateChunks
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+PAGE_SIZES = [100_000, 250_000, 500_000, 1_000_000]
+CHARACTER_THRESHOLD = 1500
+
+
+def legacy_get_number_of_chunks(text, character_threshold):
+    """get_number_of_chunks as it was before the streaming chunker, kept verbatim for comparison."""
+    if len(text) <= character_threshold:
+        return 1
+    else:
+        chunk_number = 1
+        while True:
+            div = math.ceil(len(text)/chunk_number)
+            if div <  character_threshold:
+                break
+            else:
+                chunk_number += 1
+        return chunk_number
+
+
+def legacy_rfind_regex(text):
+    pattern = r'(?<=[.!?]) +'
+    matches = list(re.finditer(pattern, text))
+    if matches:
+        return matches[-1].end() - 1
+    return -1
+
+
+def legacy_split_text_into_parts(text, num_parts, max_chunk_length):
+    """split_text_into_parts as it was before the streaming chunker, kept verbatim for comparison."""
+    chunk_length = math.ceil(len(text)/num_parts)
+    chunks = []
+    start_index = 0
+
+    remaining_text = text
+    for _ in range(num_parts - 1):
+        current_text = remaining_text[:max_chunk_length]
+        remaining_text = remaining_text[max_chunk_length:]
+
+        if len(remaining_text) == 0: # For the last
+            chunks.append(current_text.strip())
+            break
+
+        closest_ = legacy_rfind_regex(current_text)
+        if closest_ == -1:
+            closest_ = current_text.rfind('.') if current_text.rfind('.') != -1 else current_text.rfind(' ')
+            closest_ += 1
+
+        chunks.append(current_text[:closest_].strip())
+        remaining_text = current_text[closest_:] + remaining_text
+
+    return chunks
+
+
+def legacy_chunk_web_text(text):
+    chunk_number = legacy_get_number_of_chunks(text, CHARACTER_THRESHOLD)
+    if chunk_number == 1:
+        return [text]
+    return legacy_split_text_into_parts(text, chunk_number, CHARACTER_THRESHOLD)
+
+
+def build_page(sentences, size, rng):
+    page = []
+    length = 0
+    while length < size:
+        sentence = rng.choice(sentences)
+        page.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(page)
+
+
+def main():
+    rng = random.Random(20)
+    sentences = []
+    for file_name in sorted(os.listdir(DATA_DIR)):
+        with open(os.path.join(DATA_DIR, file_name)) as file:
+            sentences += [sentence for sentence in re.split(r'(?<=[.!?]) +', file.read().strip()) if sentence]
+
+    chunker = CreateChunks()
+    print(f"{'page chars':>10} {'legacy s':>9} {'stream s':>9} {'speedup':>8} {'legacy n':>9} {'stream n':>9} {'same cuts':>10} {'dropped by legacy':>18}")
+    for size in PAGE_SIZES:
+        page = build_page(sentences, size, rng)
+        assert legacy_get_number_of_chunks(page, CHARACTER_THRESHOLD) == chunker.get_number_of_chunks(page, CHARACTER_THRESHOLD)
+
+        start_time = time.perf_counter()
+        legacy = legacy_chunk_web_text(page)
+        legacy_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        chunks = chunker.chunk_web_text(page)
+        stream_time = time.perf_counter() - start_time
+
+        same_cuts = chunks[:len(legacy)] == legacy
+        covered = re.sub(r'\s+', '', "".join(chunks)) == re.sub(r'\s+', '', page)
+        dropped = len(re.sub(r'\s+', '', page)) - len(re.sub(r'\s+', '', "".join(legacy)))
+        print(
+            f"{len(page):>10} {legacy_time:>9.3f} {stream_time:>9.4f} {legacy_time / stream_time:>7.0f}x "
+            f"{len(legacy):>9} {len(chunks):>9} {str(same_cuts and covered):>10} {dropped:>12} chars"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark of the indexed snippet matcher against the original difflib scan.
+
+Pages are built from the scraped WebMD / PubMed samples in benchmarks/data, shuffled and
+repeated to the sizes seen on pubmed and drugs.com. Snippets mimic Bing snippets: a sentence
+from the page, truncated with "..." and lightly edited, plus one in five snippets that match
+nothing on the page. Agreement is reported for both kinds and is exact with the default
+matcher. A ``max_verified`` cap (opt-in) can disagree when the best full-scan ratio is barely
+above the threshold, e.g. for snippets that match nothing on the page. Degenerate pages (empty,
+or without a sentence long enough for a shingle) must agree exactly before anything is timed.
+
+Run from the repository root:
+    python -m benchmarks.bench_snippet_matcher
+"""
+import os
+import re
+import time
+import random
+import difflib
+
+from web.search_utils.scrape_data import CreateChunks
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+PAGE_SIZES = [5_000, 20_000, 60_000, 120_000]
+SNIPPETS_PER_PAGE = 20
+# (page, snippet) pairs the generated pages never produce: empty pages, pages shorter than
+# a shingle and pages whose sentences are all shorter than a shingle
+EDGE_CASES = [
+    ("", "anything here"),
+    ("A.", "anything here"),
+    ("A. B.", "anything here"),
+    ("A. B. C! D?", "A. B."),
+    ("Take with food. A. B.", "take with food"),
+]
+
+
+def legacy_similar_context_from_snippet(text, snippet, context_sentences=2, similarity_threshold=0.3):
+    """The matcher as it was before SnippetMatcher, kept verbatim for comparison."""
+    char_thrshold = 1500
+    sentences = re.split(r'(?<=[.!?]) +', text)
+    snippet_sentence = None
+    max_similarity_ratio = 0
+    for sentence in sentences:
+        similarity_ratio = difflib.SequenceMatcher(None, snippet, sentence).ratio()
+        if similarity_ratio > similarity_threshold and similarity_ratio > max_similarity_ratio:
+            snippet_sentence = sentence
+            max_similarity_ratio = similarity_ratio
+    if snippet_sentence is None:
+        return snippet
+    snippet_index = sentences.index(snippet_sentence)
+    context_start = max(0, snippet_index - context_sentences)
+    context_end = min(len(sentences), snippet_index + context_sentences + 1)
+
+    chunk_text = ' '.join(sentences[context_start:context_end])
+    if len(chunk_text) > char_thrshold:
+        closest_ = CreateChunks().rfind_regex(chunk_text)
+        if closest_ == -1:
+            closest_ = chunk_text.rfind('.') if chunk_text.rfind('.') != -1 else chunk_text.rfind(' ')
+            closest_ += 1
+        chunk_text = chunk_text[:closest_].strip()
+    return chunk_text
+
+
+def load_sentences():
+    sentences = []
+    for file_name in sorted(os.listdir(DATA_DIR)):
+        with open(os.path.join(DATA_DIR, file_name)) as file:
+            sentences += [sentence for sentence in re.split(r'(?<=[.!?]) +', file.read().strip()) if sentence]
+    return sentences
+
+
+def build_page(sentences, size, rng):
+    page = []
+    length = 0
+    while length < size:
+        sentence = rng.choice(sentences)
+        # Vary numbers so repeated sentences are not all identical
+        sentence = re.sub(r'\d+', lambda match: str(rng.randint(1, 500)), sentence)
+        page.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(page)
+
+
+def build_snippets(page, rng, count):
+    sentences = re.split(r'(?<=[.!?]) +', page)
+    snippets = []
+    for idx in range(count):
+        if idx % 5 == 4:
+            snippets.append((False, "Compare prices and print coupons for this medication at participating pharmacies near you."))
+            continue
+        sentence = rng.choice(sentences)
+        words = sentence.split()
+        start = rng.randint(0, max(0, len(words) // 3))
+        snippet = " ".join(words[start:start + rng.randint(12, 30)])
+        snippet = snippet.replace(",", "", 1).replace(" the ", " ", 1)
+        snippets.append((True, ("... " if start else "") + snippet + " ..."))
+    return snippets
+
+
+def check_edge_cases(chunker):
+    for page, snippet in EDGE_CASES:
+        legacy = legacy_similar_context_from_snippet(page, snippet)
+        indexed = chunker.similar_context_from_snippet(page, snippet)
+        assert legacy == indexed, f"edge case {page!r} / {snippet!r}: {legacy!r} != {indexed!r}"
+    print(f"edge cases: {len(EDGE_CASES)} agree")
+
+
+def main():
+    rng = random.Random(13)
+    sentences = load_sentences()
+    chunker = CreateChunks()
+    check_edge_cases(chunker)
+    print(f"{'page chars':>10} {'snippets':>8} {'difflib s':>10} {'indexed s':>10} {'speedup':>8} {'agree (page)':>13} {'agree (other)':>14}")
+    totals = {"legacy": 0.0, "indexed": 0.0, "matching": [0, 0], "unrelated": [0, 0]}
+    for size in PAGE_SIZES:
+        page = build_page(sentences, size, rng)
+        snippets = build_snippets(page, rng, SNIPPETS_PER_PAGE)
+
+        start_time = time.perf_counter()
+        legacy = [legacy_similar_context_from_snippet(page, snippet) for _, snippet in snippets]
+        legacy_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        indexed = [chunker.similar_context_from_snippet(page, snippet) for _, snippet in snippets]
+        indexed_time = time.perf_counter() - start_time
+
+        agreement = {"matching": [0, 0], "unrelated": [0, 0]}
+        for (from_page, _), old, new in zip(snippets, legacy, indexed):
+            kind = "matching" if from_page else "unrelated"
+            agreement[kind][0] += old == new
+            agreement[kind][1] += 1
+            totals[kind][0] += old == new
+            totals[kind][1] += 1
+        totals["legacy"] += legacy_time
+        totals["indexed"] += indexed_time
+        print(
+            f"{len(page):>10} {len(snippets):>8} {legacy_time:>10.3f} {indexed_time:>10.3f} {legacy_time / indexed_time:>7.1f}x "
+            f"{agreement['matching'][0] / agreement['matching'][1]:>13.1%} {agreement['unrelated'][0] / agreement['unrelated'][1]:>14.1%}"
+        )
+    print(
+        f"{'total':>10} {totals['matching'][1] + totals['unrelated'][1]:>8} {totals['legacy']:>10.3f} {totals['indexed']:>10.3f} "
+        f"{totals['legacy'] / totals['indexed']:>7.1f}x {totals['matching'][0] / totals['matching'][1]:>13.1%} "
+        f"{totals['unrelated'][0] / totals['unrelated'][1]:>14.1%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
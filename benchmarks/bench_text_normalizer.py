@@ -0,0 +1,122 @@
+"""
+Benchmark of the two-pass ScrapeWebText.preprocess_text against the original nine
+re.sub passes plus the sixteen str.replace calls of clean_text, with an equality check.
+
+Pages are the raw paragraph text extract_paragraph_text produces. By default they are
+rebuilt from the scraped WebMD / PubMed samples in benchmarks/data, with the noise those
+sites produce put back: indented markup newlines inside <p>, tabs, non-breaking spaces,
+curly quotes, UTF-8 mojibake and form underscores. Saved HTML pages can be passed instead.
+
+Run from the repository root:
+    python -m benchmarks.bench_text_normalizer [page.html ...]
+"""
+import os
+import re
+import sys
+import time
+import random
+
+from web.search_utils.scrape_data import ScrapeWebText
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+PAGE_SIZES = [5_000, 20_000, 60_000, 120_000]
+REPEATS = 20
+NOISE = [
+    "\n            ", "\n\n      \n        ", "\t\t", "\xa0", "’", "“quoted”",
+    "â\x80\x99s", "â\x80\x94", "Â\xa0", "______", " – ", "\n\t\t\n"
+]
+
+
+def legacy_clean_text(text):
+    """clean_text as it was before the single-pass normalizer, kept verbatim for comparison."""
+    replacements = {
+        "â\x80\x99": "'",
+        "â\x80\x9c": '"',
+        "â\x80\x9d": '"',
+        "â\x80\x93": '-',
+        "â\x80\x94": '--',
+        "â\x80\x98": "'",
+        "â\x80\x9a": ",",
+        "â\x80\x9e": '"',
+        "â\x80\xa0": ' ',
+        "â\x80\xa6": '...',
+        "Â\xa0": ' ',
+        "â\x80\x99s": "'s",
+        "â\x80\x90": '-',    # Hyphen
+        "â\x80\x91": '-',    # Non-breaking hyphen
+        "â\x80\x92": '-',    # Figure dash
+        "â\x80\xa2": '•'     # Bullet
+    }
+    for key, value in replacements.items():
+        text = text.replace(key, value)
+    text = text.strip()
+    return text
+
+
+def legacy_preprocess_text(text):
+    """preprocess_text as it was before the single-pass normalizer, kept verbatim for comparison."""
+    text = re.sub(r'\n\s{2,}\n', '\n',text)
+    text = re.sub(r'\n\t{2,}\n', '\n',text)
+    text = re.sub(r'\n{2,}', '\n',text)
+    text = re.sub(r'\t{2,}', '\t',text)
+    text = re.sub(r'(\n\s*){2,}', '\n\n', text)
+    text = re.sub(r'__{2,}', '_',text)
+    pattern = r'[^\x00-\x7F]'
+    text = re.sub(pattern, ' ', text)
+    text = re.sub(r' {2,}', ' ',text)
+    text = legacy_clean_text(text)
+    text = text.strip()
+    return text
+
+
+def build_page(words, size, rng):
+    page = []
+    length = 0
+    while length < size:
+        token = rng.choice(NOISE) if rng.random() < 0.04 else rng.choice(words)
+        page.append(token)
+        length += len(token) + 1
+    return " ".join(page)
+
+
+def load_pages(paths, rng):
+    scraper = ScrapeWebText()
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as file:
+                pages.append((os.path.basename(path), scraper.extract_paragraph_text(file.read())))
+        return pages
+    words = []
+    for file_name in sorted(os.listdir(DATA_DIR)):
+        with open(os.path.join(DATA_DIR, file_name)) as file:
+            words += file.read().split()
+    return [(f"{size} chars", build_page(words, size, rng)) for size in PAGE_SIZES]
+
+
+def main():
+    rng = random.Random(16)
+    scraper = ScrapeWebText()
+    pages = load_pages(sys.argv[1:], rng)
+    print(f"{'page':>24} {'legacy ms':>10} {'new ms':>10} {'speedup':>8} {'identical':>10}")
+    totals = {"legacy": 0.0, "new": 0.0}
+    for name, page in pages:
+        start_time = time.perf_counter()
+        for _ in range(REPEATS):
+            legacy = legacy_preprocess_text(page)
+        legacy_time = (time.perf_counter() - start_time) / REPEATS
+
+        start_time = time.perf_counter()
+        for _ in range(REPEATS):
+            new = scraper.preprocess_text(page)
+        new_time = (time.perf_counter() - start_time) / REPEATS
+
+        identical = legacy == new and legacy_clean_text(page) == scraper.clean_text(page)
+        totals["legacy"] += legacy_time
+        totals["new"] += new_time
+        print(f"{name[:24]:>24} {legacy_time * 1000:>10.3f} {new_time * 1000:>10.3f} {legacy_time / new_time:>7.1f}x {str(identical):>10}")
+    print(f"{'total':>24} {totals['legacy'] * 1000:>10.3f} {totals['new'] * 1000:>10.3f} {totals['legacy'] / totals['new']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
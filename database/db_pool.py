@@ -0,0 +1,130 @@
+import time
+import queue
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of DB-API connections. Connections are opened lazily through
+    ``connect`` (a factory returning a connection or None), pinged before reuse when
+    they have been idle for ``health_check_interval`` seconds or after a failed call,
+    and replaced when the ping fails.
+
+    ``run`` executes a blocking DB function on the pool's own thread executor so the
+    event loop is never blocked by SQL round-trips.
+    """
+    def __init__(self, connect, size=10, acquire_timeout=30, health_check_interval=30, health_check_query="SELECT 1"):
+        self.connect = connect
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.health_check_query = health_check_query
+
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reconnects = 0
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="db-pool")
+
+    def open_connection(self):
+        conn = self.connect()
+        if conn is None:
+            with self.lock:
+                self.opened -= 1
+            raise HTTPException(status_code=503, detail="Database connection is not available")
+        return conn
+
+    def acquire(self):
+        try:
+            conn, last_used = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.size
+                if can_open:
+                    self.opened += 1
+            if can_open:
+                return self.open_connection()
+            try:
+                conn, last_used = self.idle.get(timeout=self.acquire_timeout)
+            except queue.Empty:
+                raise HTTPException(status_code=503, detail="Timed out waiting for a database connection")
+
+        if time.time() - last_used > self.health_check_interval and not self.is_healthy(conn):
+            return self.reconnect(conn)
+        return conn
+
+    def release(self, conn, check=False):
+        if check and not self.is_healthy(conn):
+            self.discard(conn)
+            return
+        self.idle.put((conn, time.time()))
+
+    def is_healthy(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(self.health_check_query)
+                cursor.fetchall()
+            return True
+        except Exception as e:
+            print(f"Custom Exception func(is_healthy): {e}")
+            return False
+
+    def reconnect(self, conn):
+        self.close_connection(conn)
+        self.reconnects += 1
+        return self.open_connection()
+
+    def discard(self, conn):
+        self.close_connection(conn)
+        with self.lock:
+            self.opened -= 1
+
+    @staticmethod
+    def close_connection(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        failed = False
+        try:
+            yield conn
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(conn, check=failed)
+
+    def run_sync(self, func, *args, **kwargs):
+        with self.connection() as conn:
+            return func(conn, *args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(self.run_sync, func, *args, **kwargs))
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "opened": self.opened,
+            "idle": self.idle.qsize(),
+            "reconnects": self.reconnects
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        while True:
+            try:
+                conn, _ = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
@@ -2,8 +2,20 @@ import re
 import json
 
 def postprocess_drug_db(data_str):
+    """
+    Drug rows from the extraction output. A block or drug that cannot be converted is
+    logged and skipped, so one malformed drug does not discard the rest of the prescription.
+    """
     json_matches = re.findall(r'```json\n(.*?)\n```', data_str, re.DOTALL)
-    json_objects = [json.loads(match) for match in json_matches]
+    json_objects = []
+    for match in json_matches:
+        try:
+            parsed = json.loads(match)
+        except ValueError as e:
+            print(f"Custom Error: func(postprocess_drug_db) - skipping invalid JSON block: {e}")
+            continue
+        # One block may hold a list of drugs or a single drug object
+        json_objects.extend(parsed if isinstance(parsed, list) else [parsed])
 
     def convert_to_sql_schema(drug):
         return {
@@ -22,5 +34,17 @@ def postprocess_drug_db(data_str):
             "schedule_status": 0  # Default as per SQL schema
         }
 
-    final_json = convert_to_sql_schema(json_objects[-1])
-    return final_json
\ No newline at end of file
+    def drug_key(drug):
+        return tuple(" ".join(str(drug[field]).lower().split()) for field in ("drug_name", "drug_strength", "drug_form"))
+
+    drugs = {}
+    for drug in json_objects:
+        if not isinstance(drug, dict) or not drug.get("drug_name"):
+            continue
+        try:
+            drug = convert_to_sql_schema(drug)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Custom Error: func(postprocess_drug_db) - skipping drug {drug.get('drug_name')!r}: {e!r}")
+            continue
+        drugs.setdefault(drug_key(drug), drug)  # Collapse the same drug listed twice
+    return list(drugs.values())
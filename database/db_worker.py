@@ -1,4 +1,4 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException
 
 
@@ -11,17 +11,37 @@ def prescription_file_content(db, prescription_id: int):
         return result[0]
 
 
+def prescription_files_content(db, prescription_ids: List[int], max_params: int = 1000):
+    # SQL Server caps a statement at 2100 parameters, so very large batches are split
+    prescription_ids = list(dict.fromkeys(prescription_ids))
+    files = {}
+    with db.cursor() as cursor:
+        for start in range(0, len(prescription_ids), max_params):
+            ids = prescription_ids[start:start + max_params]
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(f"SELECT id, file_content FROM prescription WHERE id IN ({placeholders})", tuple(ids))
+            files.update({row[0]: row[1] for row in cursor.fetchall()})
+    return files
+
 
-def insert_drug_record(db, prescription_id, person_id, visit_occurrence_id, drug_data: Dict):
-    query = """
-        INSERT INTO drugs (
+DRUG_COLUMNS = """
             drug_name, visit_occurrence_id, drug_strength, frequency, 
             duration_in_days, drug_form, quantity, instructions, person_id, 
             refill_in_days, prescription_id, schedule_status
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
+"""
+
+RECOMMENDATION_COLUMNS = """
+            visit_occurrence_id, drug_name, dietary_recommendation, side_effects, 
+            drug_purpose, drug_consumption_pattern, person_id, prescription_id
+"""
+
+# SQL Server allows at most 2100 parameters and 1000 rows per INSERT ... VALUES
+MAX_QUERY_PARAMS = 2000
+MAX_VALUES_ROWS = 1000
 
-    values = (
+
+def drug_record_values(prescription_id, person_id, visit_occurrence_id, drug_data: Dict):
+    return (
         # drug_data.get("drug_id"),  # INT (Can be None)
         drug_data["drug_name"],  # NVARCHAR(255) (Required)
         visit_occurrence_id,  # INT (Can be None)
@@ -37,25 +57,11 @@ def insert_drug_record(db, prescription_id, person_id, visit_occurrence_id, drug
         bool(drug_data.get("schedule_status", 0))  # BIT (Defaults to 0)
     )
 
-    try:
-        with db.cursor() as cursor:
-            cursor.execute(query, values)
-            db.commit()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-
-def insert_patient_drug_recommendation(db, recommendation_data: Dict):
-    query = """
-        INSERT INTO patient_drug_recommendation (
-            visit_occurrence_id, dietary_recommendation, side_effects, 
-            drug_purpose, drug_consumption_pattern, person_id, prescription_id
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-    """
-
-    values = (
+def recommendation_values(recommendation_data: Dict):
+    return (
         recommendation_data["visit_occurrence_id"],  # INT (Required)
+        recommendation_data["drug_name"],  # NVARCHAR(255) (Required)
         recommendation_data["dietary_recommendation"],  # NVARCHAR(MAX) (Required)
         recommendation_data["side_effects"],  # NVARCHAR(MAX) (Required)
         recommendation_data["drug_purpose"],  # NVARCHAR(255) (Required)
@@ -64,10 +70,34 @@ def insert_patient_drug_recommendation(db, recommendation_data: Dict):
         recommendation_data["prescription_id"]  # INT (Can be None)
     )
 
+
+def execute_multi_row_insert(cursor, table, columns, rows: List[Tuple]):
+    if not rows:
+        return
+    num_columns = len(rows[0])
+    rows_per_query = min(MAX_VALUES_ROWS, MAX_QUERY_PARAMS // num_columns)
+    row_placeholder = "(" + ", ".join(["%s"] * num_columns) + ")"
+    for start in range(0, len(rows), rows_per_query):
+        chunk = rows[start:start + rows_per_query]
+        query = f"INSERT INTO {table} ({columns}) VALUES " + ", ".join([row_placeholder] * len(chunk))
+        cursor.execute(query, tuple(value for row in chunk for value in row))
+
+
+def insert_prescription_records(db, drug_records: List[Tuple], recommendation_records: List[Dict]):
+    """
+    Writes drug rows and recommendation rows of one or many prescriptions in a single
+    transaction using multi-row VALUES. drug_records holds
+    (prescription_id, person_id, visit_occurrence_id, drug_data) tuples.
+    Either every row is committed or none is.
+    """
+    drug_rows = [drug_record_values(*drug_record) for drug_record in drug_records]
+    recommendation_rows = [recommendation_values(recommendation_data) for recommendation_data in recommendation_records]
+
     try:
         with db.cursor() as cursor:
-            cursor.execute(query, values)
-            db.commit()
+            execute_multi_row_insert(cursor, "drugs", DRUG_COLUMNS, drug_rows)
+            execute_multi_row_insert(cursor, "patient_drug_recommendation", RECOMMENDATION_COLUMNS, recommendation_rows)
+        db.commit()
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -0,0 +1,41 @@
+-- patient_drug_recommendation: one row per drug of a visit.
+--
+-- Deployment prerequisite: run against the application database (SQL Server) before
+-- starting a build that writes patient_drug_recommendation.drug_name. Without it every
+-- insert fails and the whole prescription is rolled back.
+--
+-- Adds the drug_name column and replaces the primary key (visit_occurrence_id) with
+-- (visit_occurrence_id, drug_name). Safe to run more than once.
+
+IF COL_LENGTH('dbo.patient_drug_recommendation', 'drug_name') IS NULL
+    ALTER TABLE dbo.patient_drug_recommendation ADD drug_name NVARCHAR(255) NULL;
+GO
+
+-- Rows written before this change hold one recommendation per visit and no drug name
+UPDATE dbo.patient_drug_recommendation SET drug_name = N'' WHERE drug_name IS NULL;
+GO
+
+DECLARE @pk_name SYSNAME = (
+    SELECT name
+    FROM sys.key_constraints
+    WHERE type = 'PK' AND parent_object_id = OBJECT_ID('dbo.patient_drug_recommendation')
+);
+
+-- Nothing to do when the key already includes drug_name
+IF @pk_name IS NULL OR NOT EXISTS (
+    SELECT 1
+    FROM sys.key_constraints kc
+    JOIN sys.index_columns ic ON ic.object_id = kc.parent_object_id AND ic.index_id = kc.unique_index_id
+    JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    WHERE kc.name = @pk_name AND c.name = 'drug_name'
+)
+BEGIN
+    BEGIN TRANSACTION;
+    IF @pk_name IS NOT NULL
+        EXEC('ALTER TABLE dbo.patient_drug_recommendation DROP CONSTRAINT ' + QUOTENAME(@pk_name));
+    ALTER TABLE dbo.patient_drug_recommendation ALTER COLUMN drug_name NVARCHAR(255) NOT NULL;
+    ALTER TABLE dbo.patient_drug_recommendation
+        ADD CONSTRAINT PK_patient_drug_recommendation PRIMARY KEY (visit_occurrence_id, drug_name);
+    COMMIT TRANSACTION;
+END
+GO
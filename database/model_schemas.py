@@ -26,7 +26,9 @@ class Drug(Base):
 class PatientDrugRecommendation(Base):
     __tablename__ = 'patient_drug_recommendation'
 
+    # One row per drug of a visit, see database/migrations/001_patient_drug_recommendation_drug_name.sql
     visit_occurrence_id = Column(Integer, primary_key=True, index=True)
+    drug_name = Column(String(255), primary_key=True)
     dietary_recommendation = Column(String)
     side_effects = Column(String)
     drug_purpose = Column(String(255))
@@ -49,6 +51,7 @@ class Prescription(Base):
 # Pydantic model for the request body
 class PatientDrugRecommendationCreate(BaseModel):
     visit_occurrence_id: int
+    drug_name: str
     dietary_recommendation: str
     side_effects: str
     drug_purpose: str
@@ -0,0 +1,105 @@
+import random
+import asyncio
+
+import httpx
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class AsyncLLMClient:
+    """
+    Non-blocking client for the LLM endpoint backed by one persistent keep-alive
+    connection pool. Caps the number of in-flight calls, applies a per-call timeout
+    and retries 429/5xx responses and transport errors with exponential backoff.
+    """
+    def __init__(
+        self,
+        headers,
+        max_in_flight=16,
+        max_connections=32,
+        timeout_seconds=120,
+        max_retries=3,
+        backoff_seconds=1.0,
+        max_backoff_seconds=30.0
+    ):
+        self.headers = {key: value for key, value in headers.items() if value is not None}
+        self.max_in_flight = max_in_flight
+        self.max_connections = max_connections
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        # Created on first use so they bind to the running event loop
+        self.client = None
+        self.semaphore = None
+        self.retries = 0
+        self.failures = 0
+
+    def get_client(self):
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout_seconds, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                )
+            )
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self.client
+
+    def backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff_seconds)
+            except ValueError:
+                pass
+        delay = self.backoff_seconds * (2 ** attempt)
+        return min(delay, self.max_backoff_seconds) * random.uniform(0.5, 1.0)
+
+    async def post(self, url, data):
+        client = self.get_client()
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                response = None
+                try:
+                    response = await client.post(url, json=data)
+                    if response.status_code == 200:
+                        return response.json()
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        print(f"Custom Error func(AsyncLLMClient.post) {response.status_code}: {response.text[:200]}")
+                        self.failures += 1
+                        return None
+                    error = f"status code {response.status_code}"
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    error = repr(e)
+                except ValueError as e:
+                    # A 200 whose body is not JSON, e.g. a proxy error page
+                    error = f"invalid JSON body: {e!r}"
+
+                if attempt == self.max_retries:
+                    break
+                delay = self.backoff(attempt, response)
+                print(f"LLM call failed ({error}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+        print(f"Custom Error func(AsyncLLMClient.post) giving up after {self.max_retries} retries: {error}")
+        self.failures += 1
+        return None
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.max_in_flight - self.semaphore._value if self.semaphore else 0,
+            "retries": self.retries,
+            "failures": self.failures
+        }
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
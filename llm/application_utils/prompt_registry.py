@@ -0,0 +1,100 @@
+import os
+import time
+import hashlib
+import threading
+
+from jinja2 import Template
+
+
+class PromptRegistry:
+    """
+    Loads and compiles every ``prompts/*.txt`` template once. A template is only
+    re-read and re-compiled when its file mtime changes (checked at most every
+    ``check_interval`` seconds), so rendering a prompt never touches the disk on the hot path.
+    """
+    def __init__(self, prompts_dir, check_interval=1.0):
+        self.prompts_dir = prompts_dir
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.templates = {}
+        self.render_stats = {}
+        self.reloads = 0
+        self.load_all()
+
+    def template_path(self, name):
+        return os.path.join(self.prompts_dir, f"{name}.txt")
+
+    def load_all(self):
+        if not os.path.isdir(self.prompts_dir):
+            print(f"Custom Error: func(load_all) - Prompts directory not found: {self.prompts_dir}")
+            return
+        for file_name in sorted(os.listdir(self.prompts_dir)):
+            if file_name.endswith(".txt"):
+                self.load(file_name[:-len(".txt")])
+        print(f"Prompt Templates Loaded: {sorted(self.templates)}")
+
+    def load(self, name):
+        path = self.template_path(name)
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, mode='r') as file:
+            source = file.read()
+        template = Template(source)
+        digest = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+        with self.lock:
+            self.templates[name] = {"mtime": mtime, "digest": digest, "checked_at": time.monotonic(), "template": template}
+        return template
+
+    def get(self, name):
+        entry = self.templates.get(name)
+        if entry is None:
+            return self.load(name)
+        now = time.monotonic()
+        if now - entry["checked_at"] >= self.check_interval:
+            entry["checked_at"] = now
+            if os.stat(self.template_path(name)).st_mtime_ns != entry["mtime"]:
+                print(f"Prompt Template Changed, Reloading: {name}")
+                self.reloads += 1
+                return self.load(name)
+        return entry["template"]
+
+    def version(self, name):
+        """
+        Hash of the content of the template currently in use. Unlike the mtime, it survives
+        deploys and checkouts of the same template and changes with every edit that is loaded.
+        """
+        self.get(name)
+        return self.templates[name]["digest"]
+
+    def render(self, name, **context):
+        start_time = time.perf_counter()
+        prompt = self.get(name).render(context)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+        stats = self.render_stats.setdefault(name, {"renders": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["renders"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        return prompt
+
+    def stats(self):
+        return {
+            "templates": sorted(self.templates),
+            "reloads": self.reloads,
+            "render": {
+                name: {
+                    "renders": stats["renders"],
+                    "avg_ms": round(stats["total_ms"] / stats["renders"], 4),
+                    "max_ms": round(stats["max_ms"], 4)
+                } for name, stats in self.render_stats.items()
+            }
+        }
+
+
+_registries = {}
+
+def get_prompt_registry(cwd):
+    """One shared registry per working directory."""
+    prompts_dir = os.path.join(cwd, "prompts")
+    if prompts_dir not in _registries:
+        _registries[prompts_dir] = PromptRegistry(prompts_dir)
+    return _registries[prompts_dir]
@@ -1,21 +1,11 @@
 import re
 
-import os
-import aiofiles
-from jinja2 import Environment, FileSystemLoader, Template
-
 from utilities.async_utils import async_post_api
+from llm.application_utils.prompt_registry import get_prompt_registry
 
 async def create_prompt(config, extracted_text, check_type):
-    # template_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'prompts/{check_type}.txt')
-    template_path = os.path.join(config["current_working_dir"], f'prompts/{check_type}.txt')
-    async with aiofiles.open(template_path, mode='r') as file:
-        template_content = await file.read()
-    
-    template = Template(template_content)
-    context = {'input_text': extracted_text}
-    prompt = template.render(context)
-    return prompt
+    prompt_registry = get_prompt_registry(config["current_working_dir"])
+    return prompt_registry.render(check_type, input_text=extracted_text)
 
 
 async def model_generate(prompt, api_endpoint, model_name, model_api, max_tokens=60, temperature=0, stop=None):
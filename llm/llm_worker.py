@@ -1,10 +1,5 @@
-import os
 import re
-import json
 import httpx
-import requests
-import aiofiles
-from jinja2 import Template
 
 from utilities.utils import (
     load_configurations,
@@ -14,6 +9,8 @@ from utilities.utils import (
 from llm.application_utils.configurations import (
     update_config_from_env
 )
+from llm.application_utils.llm_client import AsyncLLMClient
+from llm.application_utils.prompt_registry import get_prompt_registry
 
 class LLMGenerator:
     def __init__(self,
@@ -39,6 +36,10 @@ class LLMGenerator:
             "stop": None
         }
 
+        client_config = self.config.get("client_config", {})
+        self.client = AsyncLLMClient(headers=self.headers, **client_config)
+        self.prompt_registry = get_prompt_registry(cwd)
+
     def init_worker(self):
         self.configurations = update_config_from_env(self.configurations)
         if not self.configurations:
@@ -49,21 +50,18 @@ class LLMGenerator:
     async def execute_llm(self, extracted_text, check_type):
         formatted_prompt = await self.create_prompt(extracted_text, check_type)
         api_config = self.api_config
-        response, chat_type = self.model_generate(formatted_prompt, **api_config)
+        response, chat_type = await self.model_generate(formatted_prompt, **api_config)
         resp = self.postprocess(response, chat_type)
         return resp
 
+    def prompt_version(self, check_type):
+        """Identifies the model and template an output of ``check_type`` was generated with."""
+        return f"{self.api_config['model_name']}:{self.prompt_registry.version(check_type)}"
+
     async def create_prompt(self, extracted_text, check_type):
-        template_path = os.path.join(self.cwd, f'prompts/{check_type}.txt')
-        async with aiofiles.open(template_path, mode='r') as file:
-            template_content = await file.read()
-        
-        template = Template(template_content)
-        context = {'input_text': extracted_text}
-        prompt = template.render(context)
-        return prompt
+        return self.prompt_registry.render(check_type, input_text=extracted_text)
     
-    def model_generate(self, prompt, api_endpoint, model_name, model_api, max_tokens=60, temperature=0, stop=None):
+    async def model_generate(self, prompt, api_endpoint, model_name, model_api, max_tokens=60, temperature=0, stop=None):
         url = f"{api_endpoint}/chat/completions" if model_api == "chat" else f"{api_endpoint}/completions"
         
         if model_api == "chat":
@@ -85,8 +83,14 @@ class LLMGenerator:
                 "stop": stop
             }
         
-        response = requests.post(url, headers=self.headers, data=json.dumps(data))
-        return response.json(), model_api
+        response = await self.client.post(url, data)
+        return response, model_api
+
+    def stats(self):
+        return {"client": self.client.stats(), "prompts": self.prompt_registry.stats()}
+
+    async def aclose(self):
+        await self.client.aclose()
     
     async def post_embedding_api(request_url, headers, data):
         async with httpx.AsyncClient(timeout=10.0) as client:
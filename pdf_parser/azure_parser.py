@@ -2,12 +2,13 @@ import os
 import re
 from pdf_parser.helpers import Timer
 from pdf_parser.table_utils import generate_markdown_table
+from pdf_parser.page_batching import PageLatencyModel, page_ranges
+from utilities.async_utils import StageLimiter
 
 import io
+import time
 import PyPDF2
 import asyncio
-import aiofiles
-from tempfile import NamedTemporaryFile
 
 from azure.core.credentials import AzureKeyCredential
 from azure.core.exceptions import HttpResponseError
@@ -19,16 +20,44 @@ from azure.ai.formrecognizer import DocumentAnalysisClient
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.ai.documentintelligence.models import AnalyzeResult
 
+PARAGRAPH_REF_PATTERN = re.compile(r"/paragraphs/(\d+)")
+
 
 class DocumentParser:
-    def __init__(self, filepath, version):
-        self.filepath = filepath
-        self.pdf_path = os.environ.get("PDF_FILES_PATH", "/rag_app/pdf_files/")
-        self.image_path = os.environ.get("PDF_IMAGES_PATH", "/rag_app/images_files/")
+    """
+    Parses a PDF held in memory and sends it to Document Intelligence as bytes, nothing is
+    written to disk.
 
-        self.file_name = self.get_file_name(filepath)
-        self.file_pdf_path = os.path.join(self.pdf_path, self.file_name)
-        self.file_image_path = os.path.join(self.image_path, self.file_name.replace(".pdf", ""))
+    - Documents of up to ``whole_document_pages`` pages are sent whole. Larger ones are split
+      into page-range PDFs sized by ``latency_model`` (at most ``max_batch_pages`` pages each).
+    - Every request is analyzed (submit and poll) in ``executor``, at most ``max_concurrent_pages``
+      requests of this document at a time (0 = all) and within ``page_limit``, a semaphore
+      shared by every document.
+    - Multi-page results are split back into one result per page, so init_parser and
+      parse_text see the same per-page data as with one request per page.
+    """
+    def __init__(
+        self,
+        document,
+        version,
+        name="document.pdf",
+        max_concurrent_pages=0,
+        page_limit=None,
+        executor=None,
+        latency_model=None,
+        whole_document_pages=2,
+        max_batch_pages=10
+    ):
+        self.document = document
+        self.file_name = name
+        self.max_concurrent_pages = max_concurrent_pages
+        self.page_limit = page_limit or StageLimiter()("page")
+        self.executor = executor
+        self.latency_model = latency_model or PageLatencyModel()
+        self.whole_document_pages = whole_document_pages
+        self.max_batch_pages = max_batch_pages
+        # Bytes held for this document: the input and the split batches. Nothing goes to disk.
+        self.usage = {"document_bytes": len(document), "page_bytes": 0, "pages": 0, "requests": 0, "disk_bytes": 0}
 
         self.timer = Timer()
 
@@ -41,8 +70,7 @@ class DocumentParser:
             self.endpoint = os.environ.get('AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT_V4')
             self.key = os.environ.get('AZURE_DOCUMENT_INTELLIGENCE_KEY_V4')
 
-        print(f"PDF File Path: {self.file_pdf_path}")
-        print(f"Image File Path: {self.file_image_path}")
+        print(f"PDF Document: {self.file_name} ({len(document)} bytes)")
 
     def version_dictionary(self,):
         version_dict = {
@@ -71,65 +99,124 @@ class DocumentParser:
             document_intelligence_client = DocumentIntelligenceClient(
                 endpoint=self.endpoint, credential=AzureKeyCredential(self.key)
             )
-            page_readers, num_pages = await self.split_pdf_to_buffered_readers(self.file_pdf_path)
-            results = await self.analyze_pages(document_intelligence_client, page_readers)
-            return results
         elif self.VERSION == "V3":
             document_intelligence_client = DocumentAnalysisClient(
                 endpoint=self.endpoint, credential=AzureKeyCredential(self.key)
             )
-            page_readers, num_pages = await self.split_pdf_to_buffered_readers(self.file_pdf_path)
-            results = await self.analyze_pages(document_intelligence_client, page_readers)
-            return results
-            # with open(self.file_pdf_path, "rb") as f:
-            #     poller =  await asyncio.to_thread(document_intelligence_client.begin_analyze_document,
-            #         "prebuilt-layout", document=f
-            #     )
-            # result = poller.result()
-            # return result.to_dict()
-        
-    async def analyze_pages(self, document_intelligence_client, page_readers):
-        async def analyze_single_page(f):
-            if self.VERSION == "V4":
-                poller = await asyncio.to_thread(document_intelligence_client.begin_analyze_document, "prebuilt-layout", analyze_request=f, content_type="application/octet-stream")
-                result = poller.result()
-                return result
-            else:
-                poller = await asyncio.to_thread(document_intelligence_client.begin_analyze_document, "prebuilt-layout", document=f)
-                result = poller.result()
-                return result.to_dict()
-            
+        batches = await self.split_pdf_batches(self.document)
+        results = await self.analyze_pages(document_intelligence_client, batches)
+        pages = []
+        for (page_count, _), result in zip(batches, results):
+            pages += [result] if page_count == 1 else self.split_result_by_page(result, page_count)
+        return pages
 
-        tasks = [analyze_single_page(f) for f in page_readers]
+    def analyze_page(self, document_intelligence_client, page_count, batch):
+        """Blocking: submits one PDF (a page or a page range) and waits for the layout result."""
+        start_time = time.perf_counter()
+        if self.VERSION == "V4":
+            poller = document_intelligence_client.begin_analyze_document("prebuilt-layout", analyze_request=batch, content_type="application/octet-stream")
+            result = poller.result()
+        else:
+            poller = document_intelligence_client.begin_analyze_document("prebuilt-layout", document=batch)
+            result = poller.result().to_dict()
+        self.latency_model.observe(page_count, time.perf_counter() - start_time)
+        return result
+
+    async def analyze_pages(self, document_intelligence_client, batches):
+        loop = asyncio.get_running_loop()
+        document_limit = StageLimiter({"page": self.max_concurrent_pages})("page")
+
+        async def analyze_single_page(page_count, batch):
+            # The poll runs off the event loop, other requests keep being served meanwhile
+            async with document_limit, self.page_limit:
+                return await loop.run_in_executor(self.executor, self.analyze_page, document_intelligence_client, page_count, batch)
+
+        tasks = [analyze_single_page(page_count, batch) for page_count, batch in batches]
         results = await asyncio.gather(*tasks)
         return results
-        
-    async def split_pdf_to_buffered_readers(self, pdf_path):
-        async with aiofiles.open(pdf_path, "rb") as pdf_file:
-            pdf_bytes = await pdf_file.read()
-
-        pdf_stream = io.BytesIO(pdf_bytes)
-        reader = await asyncio.to_thread(PyPDF2.PdfReader, pdf_stream)
-        num_pages = len(reader.pages)
-
-        async def process_page(page_num):
-            with NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-                writer = PyPDF2.PdfWriter()
+
+    def split_batches(self, pdf_bytes):
+        """[(page count, PDF bytes), ...] in page order, the document itself if it is sent whole."""
+        # BytesIO shares the buffer of a bytes object instead of copying it
+        reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+        total_pages = len(reader.pages)
+        batch_size = self.latency_model.batch_size(
+            total_pages, self.max_concurrent_pages, self.whole_document_pages, self.max_batch_pages
+        )
+        if batch_size >= total_pages:
+            return [(total_pages, pdf_bytes)]
+        batches = []
+        for first, last in page_ranges(total_pages, batch_size):
+            writer = PyPDF2.PdfWriter()
+            for page_num in range(first, last):
                 writer.add_page(reader.pages[page_num])
-                writer.write(temp_pdf)
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            batches.append((last - first, buffer.getvalue()))
+        return batches
 
-            buffered_reader = open(temp_pdf.name, "rb")
-            def cleanup():
-                os.remove(temp_pdf.name)
-            buffered_reader.close = lambda: (buffered_reader.close(), cleanup())
-            return buffered_reader
+    async def split_pdf_batches(self, pdf_bytes):
+        pdf_bytes = bytes(pdf_bytes)
+        batches = await asyncio.to_thread(self.split_batches, pdf_bytes)
+        self.usage["pages"] = sum(page_count for page_count, _ in batches)
+        self.usage["requests"] = len(batches)
+        self.usage["page_bytes"] = sum(len(batch) for _, batch in batches if batch is not pdf_bytes)
+        return batches
 
-        page_readers = await asyncio.gather(*(process_page(page_num) for page_num in range(num_pages)))        
-        return page_readers, num_pages
+    def split_result_by_page(self, result, page_count):
+        """
+        Splits the result of a multi-page request into per-page results with the paragraphs,
+        tables and figures of each page. ``/paragraphs/N`` references are renumbered to the
+        paragraph's index on its page. A table or figure spanning pages belongs to its first
+        page and only keeps the references to paragraphs on that page.
+        """
+        keys = self.version_dict[self.VERSION]
+        pages = [{"paragraphs": [], "tables": [], "figures": []} for _ in range(page_count)]
+
+        def page_of(item, default):
+            regions = item.get(keys["boundingRegions"]) or []
+            page_number = regions[0][keys["pageNumber"]] if regions else default
+            return min(max(page_number, 1), page_count)
+
+        # Global paragraph index -> (page number, index on that page)
+        paragraph_refs = {}
+        page_number = 1
+        for idx, paragraph in enumerate(result.get("paragraphs") or []):
+            page_number = page_of(paragraph, page_number)
+            paragraph_refs[idx] = (page_number, len(pages[page_number - 1]["paragraphs"]))
+            pages[page_number - 1]["paragraphs"].append(paragraph)
+
+        def renumber(item, page_number):
+            item = dict(item)
+            if "elements" in item:
+                elements = []
+                for element in item["elements"] or []:
+                    match = PARAGRAPH_REF_PATTERN.fullmatch(element)
+                    if match is None:
+                        elements.append(element)
+                        continue
+                    ref = paragraph_refs.get(int(match.group(1)))
+                    if ref is not None and ref[0] == page_number:
+                        elements.append(f"/paragraphs/{ref[1]}")
+                item["elements"] = elements
+            return item
+
+        for table in result.get("tables") or []:
+            page_number = page_of(table, 1)
+            table = dict(table)
+            if "cells" in table:
+                table["cells"] = [renumber(cell, page_number) for cell in table["cells"]]
+            pages[page_number - 1]["tables"].append(table)
+
+        for figure in result.get("figures") or []:
+            page_number = page_of(figure, 1)
+            figure = renumber(figure, page_number)
+            if figure.get("caption"):
+                figure["caption"] = renumber(figure["caption"], page_number)
+            pages[page_number - 1]["figures"].append(figure)
+
+        return pages
 
-    def get_file_name(self, filepath):
-        return filepath[filepath.rfind("/")+1:]
-    
     def parsed_figures_and_captions(self, data, pages_obj, page_number):
         figure_elements, caption_elements = [], []
         if 'figures' in data:
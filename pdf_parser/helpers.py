@@ -1,4 +1,3 @@
-import os
 import time
 
 def calculate_time(start_time):
@@ -9,16 +8,6 @@ def calculate_time(start_time):
     print(f"*********Elapsed Time: {int(hours)} Hours, {int(minutes)} Minutes, {int(seconds)} Seconds*********")
 
 
-# Remove PDF Files
-def remove_pdf_file(file_pdf_path):        
-    if os.path.exists(file_pdf_path):
-        try:
-            os.chmod(file_pdf_path, 0o777)
-            os.remove(file_pdf_path)
-        except Exception as e:
-            print(f"Exception: {e}")
-
-
 class TimerContext:
     def __init__(self, timer: "Timer", name: str):
         self.timer = timer
@@ -0,0 +1,66 @@
+import math
+import threading
+
+
+class PageLatencyModel:
+    """
+    Online estimate of the latency of one analyze request: ``overhead + page_seconds * pages``.
+    Fitted by exponentially weighted least squares over the observed requests, so it follows
+    the service as its latency drifts. Shared by every document, observed from poll threads.
+    """
+    def __init__(self, overhead_seconds=3.0, page_seconds=1.0, alpha=0.2):
+        self.overhead_seconds = overhead_seconds
+        self.page_seconds = page_seconds
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.observations = 0
+        # Weighted means of pages, seconds, pages^2 and pages*seconds
+        self.moments = None
+
+    def observe(self, pages, seconds):
+        with self.lock:
+            self.observations += 1
+            sample = (pages, seconds, pages * pages, pages * seconds)
+            if self.moments is None:
+                self.moments = sample
+            else:
+                self.moments = tuple(moment + self.alpha * (value - moment) for moment, value in zip(self.moments, sample))
+            mean_pages, mean_seconds, mean_pages_sq, mean_pages_seconds = self.moments
+            variance = mean_pages_sq - mean_pages * mean_pages
+            # Until requests of different sizes were seen only the overhead can be fitted
+            if variance > 0.25:
+                self.page_seconds = max((mean_pages_seconds - mean_pages * mean_seconds) / variance, 0.0)
+            self.overhead_seconds = max(mean_seconds - self.page_seconds * mean_pages, 0.0)
+
+    def estimate(self, pages):
+        return self.overhead_seconds + self.page_seconds * pages
+
+    def batch_size(self, total_pages, concurrency, whole_document_pages=2, max_batch_pages=10):
+        """
+        Pages per analyze request for a document of ``total_pages``. Small documents are sent
+        whole, larger ones in the batch size with the lowest estimated wall time given that at
+        most ``concurrency`` requests run at once; ties go to fewer requests.
+        """
+        if total_pages <= max(whole_document_pages, 1):
+            return total_pages
+        concurrency = concurrency or total_pages
+        best = None
+        for size in range(1, min(total_pages, max_batch_pages) + 1):
+            requests = math.ceil(total_pages / size)
+            rounds = math.ceil(requests / concurrency)
+            cost = (round(rounds * self.estimate(size), 6), requests)
+            if best is None or cost < best[0]:
+                best = (cost, size)
+        return best[1]
+
+    def stats(self):
+        return {
+            "overhead_seconds": round(self.overhead_seconds, 3),
+            "page_seconds": round(self.page_seconds, 3),
+            "observations": self.observations
+        }
+
+
+def page_ranges(total_pages, batch_size):
+    """[(first, last), ...] zero-based, last exclusive."""
+    return [(start, min(start + batch_size, total_pages)) for start in range(0, total_pages, batch_size)]
@@ -1,15 +1,11 @@
-import os
 import time
 import logging
 import argparse
 
-import base64
 import hashlib
-import aiofiles
 import asyncio
-
-from fastapi import UploadFile
-from io import BytesIO
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import uvicorn
 from fastapi import (
@@ -17,7 +13,6 @@ from fastapi import (
     APIRouter, 
     Request, 
     BackgroundTasks,
-    UploadFile, 
     File, 
     Body, 
     Form
@@ -27,56 +22,123 @@ from fastapi.responses import StreamingResponse, JSONResponse
 from typing import List, Dict, Optional
 from pydantic import BaseModel, Field
 
-from pdf_parser.helpers import calculate_time, remove_pdf_file
+from pdf_parser.helpers import calculate_time
 from pdf_parser.azure_parser import DocumentParser
+from pdf_parser.page_batching import PageLatencyModel
+from pdf_parser.text_layer import TextLayerParser
 
 class ParserWorker:
     def __init__(
         self,
         parser_type: str,
         azure_version: str,
-        cwd: str
+        cwd: str,
+        document_cache=None,
+        stage_limits=None,
+        config: Optional[dict] = None
     ):
         global worker
         self.parser_type = parser_type
         self.azure_version = azure_version
         self.cwd = cwd
-
-    async def execute_parser(self, file_path):
+        self.document_cache = document_cache
+        self.config = config or {}
+        # "pdf_page" bounds the pages under analysis across all documents
+        self.stage_limits = stage_limits
+        self.max_concurrent_pages = self.config.get("max_concurrent_pages", 4)
+        # Latency of analyze requests across documents, sizes the page batches of the next ones
+        self.latency_model = PageLatencyModel(**self.config.get("latency_prior", {}))
+        # Page polls block a thread for the whole analysis, they get their own threads
+        # instead of starving the default executor used by the caches and PyPDF2
+        self.executor = ThreadPoolExecutor(max_workers=self.config.get("poll_threads", 16), thread_name_prefix="azure-poll")
+        # Digital PDFs are read from their text layer, only failing pages go to Azure
+        self.text_layer_config = dict(self.config.get("text_layer", {}))
+        self.text_layer_enabled = self.text_layer_config.pop("enabled", True)
+        self.local_pages = 0
+        self.azure_pages = 0
+        # Memory and disk usage of the most recent parses, see stats()
+        self.recent_usage = deque(maxlen=50)
+        self.documents_parsed = 0
+        self.max_memory_bytes = 0
+
+    async def parse_text_layer(self, pdf_bytes):
+        """(local document, fallback page numbers, text-layer parser), or None if PyPDF2 cannot read it."""
+        if not self.text_layer_enabled:
+            return None
+        try:
+            # Opening the PDF is as blocking as parsing it, both run in the thread
+            return await asyncio.to_thread(self.run_text_layer, pdf_bytes)
+        except Exception as e:
+            print(f"Custom Error: func(parse_text_layer) - {e}")
+            return None
+
+    def run_text_layer(self, pdf_bytes):
+        local_parser = TextLayerParser(pdf_bytes, **self.text_layer_config)
+        doc, fallback_pages = local_parser.run_parser()
+        return doc, fallback_pages, local_parser
+
+    async def execute_parser(self, pdf_bytes, hash_code):
 
         parsed_text = {}
-        
+        usage = {"document_bytes": len(pdf_bytes), "page_bytes": 0, "pages": 0, "requests": 0, "disk_bytes": 0, "local_pages": 0}
+
+        local = await self.parse_text_layer(pdf_bytes)
+        if local is not None:
+            parsed_text, fallback_pages, local_parser = local
+            usage["pages"] = parsed_text["total_pages"]
+            usage["local_pages"] = parsed_text["total_pages"] - len(fallback_pages)
+            print(f"Text Layer: {usage['local_pages']}/{usage['pages']} pages parsed locally, Azure pages: {fallback_pages}")
+            if not fallback_pages:
+                self.record_usage(hash_code, usage)
+                return {"response": parsed_text}
+            if len(fallback_pages) == parsed_text["total_pages"]:
+                # Fully scanned documents go to Azure as they are, without rewriting them through PyPDF2
+                azure_bytes = pdf_bytes
+            else:
+                azure_bytes = await asyncio.to_thread(local_parser.subset, fallback_pages)
+                usage["page_bytes"] += len(azure_bytes)
+        else:
+            fallback_pages = None
+            azure_bytes = pdf_bytes
+
         print(f'{"#"*30}\nAZURE PARSER\n{"#"*30}\n')
-        parser = DocumentParser(file_path, self.azure_version)
-        parsed_text = await parser.run_parser()
-            
-                
-        remove_pdf_file(file_path)
+        parser = DocumentParser(
+            azure_bytes,
+            self.azure_version,
+            name=f"{hash_code}.pdf",
+            max_concurrent_pages=self.max_concurrent_pages,
+            page_limit=self.stage_limits("pdf_page") if self.stage_limits else None,
+            executor=self.executor,
+            latency_model=self.latency_model,
+            whole_document_pages=self.config.get("whole_document_pages", 2),
+            max_batch_pages=self.config.get("max_batch_pages", 10)
+        )
+        azure_text = await parser.run_parser()
+        usage["page_bytes"] += parser.usage["page_bytes"]
+        usage["requests"] = parser.usage["requests"]
+        if fallback_pages is None:
+            parsed_text = azure_text
+            usage["pages"] = parser.usage["pages"]
+        else:
+            # Page N of the Azure result is the N-th page that failed the quality check
+            for idx, page_number in enumerate(fallback_pages, start=1):
+                parsed_text[str(page_number)] = azure_text.get(str(idx), {"text": "", "tables": [], "images": []})
+            if "title" in azure_text:
+                parsed_text["title"] = azure_text["title"]
+        self.record_usage(hash_code, usage)
         return {"response": parsed_text}
 
-    async def write_bytes_to_pdfs(self, file, pdf_files_path, hash_code):
-        pdf_bytes = file.file.read()
-        # pdf_bytes = file
-        filename = f"{hash_code}.pdf"
-        file_path = os.path.join(pdf_files_path, str(hash_code) + ".pdf")
-        files_info = { 
-            "hash_code": str(hash_code), 
-            "filepath": file_path, 
-            "filename": filename
-        }
-        print(f"Processing PDF: {filename}\nPDF Info: {files_info}")
-
-        async with aiofiles.open(file_path, "wb") as binary_file:
-            await binary_file.write(pdf_bytes)
-        
-        return files_info
+    def record_usage(self, hash_code, usage):
+        memory_bytes = usage["document_bytes"] + usage["page_bytes"]
+        self.documents_parsed += 1
+        self.local_pages += usage["local_pages"]
+        self.azure_pages += usage["pages"] - usage["local_pages"]
+        self.max_memory_bytes = max(self.max_memory_bytes, memory_bytes)
+        self.recent_usage.append(dict(usage, hash_code=hash_code, memory_bytes=memory_bytes))
+        print(f"PDF Usage: {usage['pages']} pages ({usage['local_pages']} local, {usage['requests']} Azure requests), {memory_bytes} bytes in memory, {usage['disk_bytes']} bytes on disk")
 
     def generate_hash_key(self, pdf_bytes):
-        encoded_string = base64.b64encode(pdf_bytes).decode('utf-8')
-        hasher = hashlib.sha256()
-        hasher.update(encoded_string.encode('utf-8'))
-        hash_code = hasher.hexdigest()
-        return hash_code
+        return hashlib.sha256(pdf_bytes).hexdigest()
     
     def extract_text_and_tables(self, pdf_data: dict):
         response = pdf_data.get("response", {})
@@ -98,13 +160,30 @@ class ParserWorker:
 
         return "\n\n".join(extracted_content)
     
-    async def execute_parse_text(self, file: bytes):
-        hash_code = self.generate_hash_key(file)
-        filename = str(hash_code) + ".pdf"
-        pdf_bytes = UploadFile(filename=filename, file=BytesIO(file))
-        pdf_file_path = os.environ.get('PDF_FILES_PATH', "/rag_app/pdf_files/")
-        os.makedirs(pdf_file_path, exist_ok=True)
-        file_info = await self.write_bytes_to_pdfs(pdf_bytes, pdf_file_path, hash_code)
-        pdf_data = await self.execute_parser(file_info['filepath'])
-        output = self.extract_text_and_tables(pdf_data)
-        return output
+    async def execute_parse_text(self, file: bytes, hash_code: Optional[str] = None):
+        hash_code = hash_code or self.generate_hash_key(file)
+        if self.document_cache is None:
+            output, _ = await self.parse_text(file, hash_code)
+            return output
+        # Concurrent requests for the same document share one parse
+        return await self.document_cache.get_or_compute(
+            self.document_cache.text_key(hash_code), lambda: self.parse_text(file, hash_code)
+        )
+
+    async def parse_text(self, file: bytes, hash_code: str):
+        pdf_data = await self.execute_parser(file, hash_code)
+        # A document the parser returned no pages for is parsed again next time
+        return self.extract_text_and_tables(pdf_data), bool(pdf_data["response"].get("total_pages"))
+
+    def stats(self):
+        return {
+            "documents_parsed": self.documents_parsed,
+            "max_memory_bytes": self.max_memory_bytes,
+            "local_pages": self.local_pages,
+            "azure_pages": self.azure_pages,
+            "latency_model": self.latency_model.stats(),
+            "recent": list(self.recent_usage)
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
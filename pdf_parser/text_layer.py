@@ -0,0 +1,224 @@
+import io
+import re
+
+import PyPDF2
+from PyPDF2.generic import ArrayObject, ContentStream
+
+from pdf_parser.table_utils import generate_markdown_table
+
+WORD_PATTERN = re.compile(r"[\w.,:;!?()\[\]'\"/%&+#*@$-]+")
+IDENTITY = (1, 0, 0, 1, 0, 0)
+# Form XObjects nested deeper than this are not inspected, the page is treated as an image
+MAX_FORM_DEPTH = 8
+
+
+def multiply(first, second):
+    """Product of two PDF matrices (a, b, c, d, e, f), ``first`` applied before ``second``."""
+    a, b, c, d, e, f = (float(value) for value in first)
+    a2, b2, c2, d2, e2, f2 = (float(value) for value in second)
+    return (
+        a * a2 + b * c2, a * b2 + b * d2,
+        c * a2 + d * c2, c * b2 + d * d2,
+        e * a2 + f * c2 + e2, e * b2 + f * d2 + f2
+    )
+
+
+class TextLayerParser:
+    """
+    Local parser for digitally generated PDFs: reads the text layer with PyPDF2 and
+    rebuilds lines and simple tables from the text positions.
+
+    A page passes when its text layer has at least ``min_chars`` visible characters, at
+    least ``min_printable_ratio`` of them are ordinary printable characters and at least
+    ``min_word_ratio`` of its tokens look like words. Its text must also cover at least
+    ``min_text_coverage`` of the page, and the images it draws at most ``max_image_coverage``
+    (0 by default: any visible image). Scanned pages, pages with broken font encodings and
+    pages whose content may be in an image (a typed letterhead above a scanned list) fail and
+    are left to Document Intelligence.
+
+    ``run_parser`` returns the same document structure as DocumentParser.run_parser,
+    with the pages that failed left out, and the numbers of those pages.
+    """
+    def __init__(
+        self,
+        document,
+        min_chars=20,
+        min_printable_ratio=0.9,
+        min_word_ratio=0.6,
+        min_table_columns=3,
+        min_text_coverage=0.02,
+        max_image_coverage=0.0
+    ):
+        self.document = document
+        self.min_chars = min_chars
+        self.min_printable_ratio = min_printable_ratio
+        self.min_word_ratio = min_word_ratio
+        self.min_table_columns = min_table_columns
+        self.min_text_coverage = min_text_coverage
+        self.max_image_coverage = max_image_coverage
+        self.reader = PyPDF2.PdfReader(io.BytesIO(document))
+
+    def page_fragments(self, page):
+        """Text runs of a page as (x, y, size, text), in user space."""
+        fragments = []
+
+        def visitor(text, cm, tm, font_dict, font_size):
+            text = " ".join(text.split())
+            if not text:
+                return
+            x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+            y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+            size = abs(font_size * tm[3] * cm[3]) or abs(font_size) or 10.0
+            fragments.append((x, y, size, text))
+
+        page.extract_text(visitor_text=visitor)
+        return fragments
+
+    def image_area(self, contents, resources, ctm, depth=0):
+        """
+        Area, in user space, of the images a content stream draws: image XObjects, inline
+        images and the images inside form XObjects. Overlapping images are counted twice.
+        """
+        if depth > MAX_FORM_DEPTH:
+            return float("inf")
+        resources = resources.get_object() if resources is not None else {}
+        xobjects = resources.get("/XObject")
+        xobjects = xobjects.get_object() if xobjects is not None else {}
+        if isinstance(contents, ArrayObject):
+            data = b"\n".join(item.get_object().get_data() for item in contents)
+        else:
+            data = contents.get_data()
+        # Most text pages draw nothing, they are not worth parsing twice
+        if not xobjects and b"BI" not in data:
+            return 0.0
+
+        area = 0.0
+        stack = []
+        for operands, operator in ContentStream(contents, self.reader).operations:
+            if operator == b"q":
+                stack.append(ctm)
+            elif operator == b"Q":
+                ctm = stack.pop() if stack else ctm
+            elif operator == b"cm":
+                ctm = multiply(operands, ctm)
+            elif operator == b"INLINE IMAGE":
+                area += abs(ctm[0] * ctm[3] - ctm[1] * ctm[2])
+            elif operator == b"Do" and operands and operands[0] in xobjects:
+                xobject = xobjects[operands[0]].get_object()
+                if xobject.get("/Subtype") == "/Image":
+                    # An image fills the unit square of the current matrix
+                    area += abs(ctm[0] * ctm[3] - ctm[1] * ctm[2])
+                elif xobject.get("/Subtype") == "/Form":
+                    form_ctm = multiply(xobject.get("/Matrix", IDENTITY), ctm)
+                    area += self.image_area(xobject, xobject.get("/Resources", resources), form_ctm, depth + 1)
+        return area
+
+    def page_coverage(self, page, fragments):
+        """Share of the page covered by text (estimated glyph boxes) and by images."""
+        page_area = float(page.mediabox.width) * float(page.mediabox.height)
+        if page_area <= 0:
+            return {"text_coverage": 0.0, "image_coverage": 1.0}
+        text_area = sum(len(text) * size * 0.5 * size for _, _, size, text in fragments)
+        try:
+            contents = page.get_contents()
+            image_area = self.image_area(contents, page.get("/Resources"), IDENTITY) if contents is not None else 0.0
+        except Exception:
+            # A page whose drawing cannot be inspected could hold anything
+            image_area = page_area
+        return {
+            "text_coverage": round(min(text_area / page_area, 1.0), 3),
+            "image_coverage": round(min(image_area / page_area, 1.0), 3)
+        }
+
+    def page_lines(self, fragments):
+        """Fragments grouped into lines, top to bottom; every line is a list of cells, left to right."""
+        lines = []
+        for x, y, size, text in sorted(fragments, key=lambda fragment: (-fragment[1], fragment[0])):
+            if lines and abs(lines[-1]["y"] - y) <= size * 0.5:
+                lines[-1]["fragments"].append((x, size, text))
+            else:
+                lines.append({"y": y, "fragments": [(x, size, text)]})
+
+        cell_lines = []
+        for line in lines:
+            cells = []
+            end = None
+            for x, size, text in sorted(line["fragments"]):
+                # Runs closer than a couple of characters belong to the same cell
+                if end is not None and x - end <= size * 1.5:
+                    cells[-1] += ("" if x - end <= size * 0.15 else " ") + text
+                else:
+                    cells.append(text)
+                end = x + len(text) * size * 0.5
+            cell_lines.append(cells)
+        return cell_lines
+
+    def is_key_value_line(self, cells):
+        return len(cells) % 2 == 0 and all(key.endswith(":") for key in cells[0::2])
+
+    def split_tables(self, lines):
+        """(text lines, markdown tables): runs of two or more lines with the same number of cells become a table."""
+        text_lines, tables = [], []
+        idx = 0
+        while idx < len(lines):
+            columns = len(lines[idx])
+            end = idx
+            if columns >= self.min_table_columns and not self.is_key_value_line(lines[idx]):
+                while end + 1 < len(lines) and len(lines[end + 1]) == columns and not self.is_key_value_line(lines[end + 1]):
+                    end += 1
+            if end > idx:
+                rows = lines[idx:end + 1]
+                cell_data = [(row_idx, col_idx, cell) for row_idx, row in enumerate(rows) for col_idx, cell in enumerate(row)]
+                tables.append(generate_markdown_table(columns, len(rows), cell_data))
+            else:
+                text_lines.append(" ".join(lines[idx]))
+            idx = end + 1
+        return text_lines, tables
+
+    def page_quality(self, text):
+        visible = [char for char in text if not char.isspace()]
+        tokens = text.split()
+        printable = sum(1 for char in visible if char.isprintable() and char != "\ufffd")
+        words = sum(1 for token in tokens if WORD_PATTERN.fullmatch(token) and any(char.isalnum() for char in token))
+        return {
+            "chars": len(visible),
+            "printable_ratio": round(printable / len(visible), 3) if visible else 0.0,
+            "word_ratio": round(words / len(tokens), 3) if tokens else 0.0
+        }
+
+    def passes(self, quality):
+        return (
+            quality["chars"] >= self.min_chars
+            and quality["printable_ratio"] >= self.min_printable_ratio
+            and quality["word_ratio"] >= self.min_word_ratio
+            and quality["text_coverage"] >= self.min_text_coverage
+            and quality["image_coverage"] <= self.max_image_coverage
+        )
+
+    def parse_page(self, page):
+        fragments = self.page_fragments(page)
+        lines = self.page_lines(fragments)
+        quality = self.page_quality(" ".join(cell for cells in lines for cell in cells))
+        quality.update(self.page_coverage(page, fragments))
+        text_lines, tables = self.split_tables(lines)
+        return {"text": "\n".join(text_lines).strip(), "tables": tables, "images": []}, quality
+
+    def run_parser(self):
+        doc = {"total_pages": len(self.reader.pages)}
+        fallback_pages = []
+        for page_number, page in enumerate(self.reader.pages, start=1):
+            page_obj, quality = self.parse_page(page)
+            if self.passes(quality):
+                doc[str(page_number)] = page_obj
+            else:
+                fallback_pages.append(page_number)
+        return doc, fallback_pages
+
+    def subset(self, page_numbers):
+        """A PDF of the given pages (1-based), as bytes."""
+        writer = PyPDF2.PdfWriter()
+        for page_number in page_numbers:
+            writer.add_page(self.reader.pages[page_number - 1])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
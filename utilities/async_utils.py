@@ -1,64 +1,247 @@
-import httpx 
+import httpx
+import asyncio
+import importlib.util
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
 
-async def async_post_api(request_url, headers, data=None):
-    timeout = httpx.Timeout(3 * 3600)
-    try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response_ = await client.post(
-                url=request_url,
-                headers=headers,
-                json=data 
+#############################################################################################
+#                                 SHARED HTTP CLIENTS
+#############################################################################################
+
+class HTTPClientManager:
+    """
+    Process-wide pool of keep-alive ``httpx.AsyncClient`` objects, one per host, so
+    repeated calls to Bing, the scraped sites or the LLM endpoint reuse TCP/TLS connections.
+    Each host gets its own connection limits; once more than ``max_hosts`` are open, the least
+    recently used idle host clients are closed. A client with requests in flight is never
+    closed, so the pool may briefly exceed ``max_hosts``. Started and closed with the app lifespan.
+    """
+    def __init__(
+        self,
+        max_connections_per_host=10,
+        max_keepalive_per_host=10,
+        keepalive_expiry=30.0,
+        max_hosts=64,
+        http2=False,
+        timeout=30.0,
+        connect_timeout=5.0
+    ):
+        self.configure(
+            max_connections_per_host=max_connections_per_host,
+            max_keepalive_per_host=max_keepalive_per_host,
+            keepalive_expiry=keepalive_expiry,
+            max_hosts=max_hosts,
+            http2=http2,
+            timeout=timeout,
+            connect_timeout=connect_timeout
+        )
+        self.clients = OrderedDict()
+        self.host_stats = {}
+        # Requests in flight per host, and close tasks of evicted clients still running
+        self.in_flight = {}
+        self.closing = set()
+
+    def configure(self, **config):
+        for key, value in config.items():
+            setattr(self, key, value)
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            print("Custom Error: func(HTTPClientManager.configure) - http2 requested but the h2 package is missing, using HTTP/1.1")
+            self.http2 = False
+
+    async def start(self):
+        print(f"HTTP Client Manager started (http2={self.http2}, max_connections_per_host={self.max_connections_per_host})")
+
+    def get_client(self, url):
+        parts = urlsplit(str(url))
+        host = f"{parts.scheme}://{parts.netloc}"
+        client = self.clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections_per_host,
+                    max_keepalive_connections=self.max_keepalive_per_host,
+                    keepalive_expiry=self.keepalive_expiry
+                )
             )
-            await client.aclose()
-            response_.raise_for_status()
-            return response_
+            self.clients[host] = client
+            self.host_stats.setdefault(host, {"requests": 0, "new_connections": 0, "errors": 0})
+        self.clients.move_to_end(host)
+        self.evict()
+        return host, client
+
+    def evict(self):
+        idle = [host for host in self.clients if not self.in_flight.get(host)]
+        for host in idle[:max(len(self.clients) - self.max_hosts, 0)]:
+            task = asyncio.create_task(self.clients.pop(host).aclose())
+            self.closing.add(task)
+            task.add_done_callback(self.closed)
+
+    def closed(self, task):
+        self.closing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Custom Error: func(HTTPClientManager.evict) - {task.exception()}")
+
+    def acquire(self, url):
+        host, client = self.get_client(url)
+        self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        self.host_stats[host]["requests"] += 1
+        return host, client
+
+    def release(self, host):
+        self.in_flight[host] -= 1
+        if not self.in_flight[host]:
+            del self.in_flight[host]
+
+    def connection_tracer(self, host):
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                self.host_stats[host]["new_connections"] += 1
+        return trace
+
+    async def request(self, method, url, timeout=None, **kwargs):
+        host, client = self.acquire(url)
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        try:
+            return await client.request(method, url, extensions={"trace": self.connection_tracer(host)}, **kwargs)
+        except Exception:
+            self.host_stats[host]["errors"] += 1
+            raise
+        finally:
+            self.release(host)
+
+    @asynccontextmanager
+    async def stream(self, method, url, timeout=None, **kwargs):
+        """Like ``request`` but yields the response before the body is read, for capped downloads."""
+        host, client = self.acquire(url)
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        try:
+            async with client.stream(method, url, extensions={"trace": self.connection_tracer(host)}, **kwargs) as response:
+                yield response
+        except Exception:
+            self.host_stats[host]["errors"] += 1
+            raise
+        finally:
+            self.release(host)
+
+    def stats(self):
+        hosts = {}
+        for host, stats in self.host_stats.items():
+            reused = max(stats["requests"] - stats["new_connections"], 0)
+            hosts[host] = dict(stats, reuse_ratio=round(reused / stats["requests"], 4) if stats["requests"] else 0.0)
+        return {"open_clients": len(self.clients), "http2": self.http2, "hosts": hosts}
+
+    async def aclose(self):
+        clients = list(self.clients.values())
+        self.clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), *self.closing, return_exceptions=True)
+        print("HTTP Client Manager closed")
+
+
+http_clients = HTTPClientManager()
+
+#############################################################################################
+#                                 API HELPERS
+#############################################################################################
+
+async def async_post_api(request_url, headers, data=None, timeout=120.0):
+    try:
+        response_ = await http_clients.request(
+            'post',
+            request_url,
+            headers=headers,
+            json=data,
+            timeout=timeout
+        )
+        response_.raise_for_status()
+        return response_
     except httpx.HTTPStatusError as http_err:
         print(f"HTTP error occurred: {http_err}")
     except Exception as e:
         print(f"Custom Exception func(fetch_embeddings_async): {e}")
         return []
     
-async def async_post_api_data(request_url, headers, data=None):
-    timeout = httpx.Timeout(3 * 3600)
+async def async_post_api_data(request_url, headers, data=None, timeout=120.0):
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response_ = await client.request(
-                method='post',
-                url=request_url,
-                headers=headers,
-                data=data 
-            )
-            await client.aclose()
-            return response_
+        response_ = await http_clients.request(
+            'post',
+            request_url,
+            headers=headers,
+            data=data,
+            timeout=timeout
+        )
+        return response_
     except Exception as e:
         print(f"Custom Exception func(async_post_api): {e}")
         return []
     
-async def async_post_api_files(request_url, headers, files):
-    timeout = httpx.Timeout(3 * 3600)
+async def async_post_api_files(request_url, headers, files, timeout=300.0):
     try:
-        async with httpx.AsyncClient(follow_redirects=True, timeout=timeout) as client:
-            response_ = await client.post(
-                url=request_url,
-                headers=headers,
-                files=files 
-            )
-            return response_
+        response_ = await http_clients.request(
+            'post',
+            request_url,
+            headers=headers,
+            files=files,
+            follow_redirects=True,
+            timeout=timeout
+        )
+        return response_
     except Exception as e:
         print(f"Custom Exception func(async_post_api): {e}")
         return []
     
-async def async_get_api(request_url, headers, params=None):
+async def async_get_api(request_url, headers, params=None, timeout=10.0):
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response_ = await client.request(
-                method='get',
-                url=request_url,
-                headers=headers,
-                params=params 
-            )
-            await client.aclose()
-            return response_
+        response_ = await http_clients.request(
+            'get',
+            request_url,
+            headers=headers,
+            params=params,
+            timeout=timeout
+        )
+        return response_
     except Exception as e:
         print(f"Custom Exception func(async_get_api): {e}")
-        return []
\ No newline at end of file
+        return []
+
+#############################################################################################
+#                                 CONCURRENCY
+#############################################################################################
+
+class StageLimiter:
+    """
+    Named semaphores shared by every request, one per pipeline stage.
+    Semaphores are created lazily so they bind to the running event loop.
+    A limit of 0 (or an unknown stage) means unlimited.
+    """
+    def __init__(self, limits=None):
+        self.limits = dict(limits or {})
+        self.semaphores = {}
+
+    def __call__(self, stage):
+        limit = self.limits.get(stage, 0)
+        if not limit:
+            return _NoLimit()
+        if stage not in self.semaphores:
+            self.semaphores[stage] = asyncio.Semaphore(limit)
+        return self.semaphores[stage]
+
+    def stats(self):
+        return {
+            stage: {
+                "limit": limit,
+                "available": self.semaphores[stage]._value if stage in self.semaphores else limit
+            } for stage, limit in self.limits.items()
+        }
+
+
+class _NoLimit:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+
+#############################################################################################
+#                                 MEMORY TIER
+#############################################################################################
+
+class TTLCache:
+    """
+    Size-bounded in-memory LRU cache whose entries expire after ``ttl`` seconds.
+    """
+    def __init__(self, max_entries=256, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and (entry[0] is None or entry[0] > time.time())
+
+    def stats(self):
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+#############################################################################################
+#                                 DISK TIER
+#############################################################################################
+
+class SQLiteCache:
+    """
+    Local on-disk key/value store with TTL and LRU eviction, survives restarts.
+    Values are stored as JSON.
+    """
+    def __init__(self, db_path, table="cache", max_entries=10000, ttl=None):
+        self.db_path = db_path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)")
+            self.conn.commit()
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.conn.commit()
+                return default
+            self.conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            self.conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self.conn.commit()
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+#############################################################################################
+#                                 TIERED CACHE
+#############################################################################################
+
+class TieredCache:
+    """
+    In-memory LRU tier in front of a SQLite tier. Disk hits are promoted to memory.
+    The async helpers run the disk tier in a thread so the event loop is never blocked.
+    ``get_or_compute`` is single-flight: concurrent misses of one key share one computation.
+    """
+    def __init__(self, db_path, table, ttl, max_memory_entries=512, max_disk_entries=10000):
+        self.ttl = ttl
+        self.memory = TTLCache(max_entries=max_memory_entries, ttl=ttl)
+        self.disk = SQLiteCache(db_path, table=table, max_entries=max_disk_entries, ttl=ttl)
+        self.in_flight = {}
+        self.waiters = {}
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.abandoned = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            self.memory_hits += 1
+            return value
+        value = self.disk.get(key)
+        if value is not None:
+            self.memory.set(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    async def aget(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            self.memory_hits += 1
+            return value
+        value = await asyncio.to_thread(self.disk.get, key)
+        if value is not None:
+            self.memory.set(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    async def aset(self, key, value):
+        self.memory.set(key, value)
+        await asyncio.to_thread(self.disk.set, key, value)
+
+    async def get_or_compute(self, key, compute):
+        """
+        Cached value of ``key``, or the value of ``await compute()``, which returns
+        (value, cacheable); only cacheable values are stored. Callers missing the same key
+        while it is computed wait for that computation instead of starting their own.
+        """
+        future = self.in_flight.get(key)
+        if future is None:
+            value = await self.aget(key)
+            if value is not None:
+                return value
+            # Another caller may have started the computation during the disk lookup
+            future = self.in_flight.get(key)
+        if future is not None:
+            self.shared += 1
+        else:
+            future = asyncio.ensure_future(self.compute_and_store(key, compute))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done: self.forget(key, done))
+        # Shielded so a cancelled caller does not cancel the computation other callers wait on
+        self.waiters[key] = self.waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self.waiters[key] == 1 and not future.done():
+                self.abandoned += 1
+                future.cancel()
+                self.forget(key, future)
+            raise
+        finally:
+            self.waiters[key] -= 1
+            if not self.waiters[key]:
+                del self.waiters[key]
+
+    def forget(self, key, future):
+        # Only drop the entry if a newer computation has not replaced it
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+
+    async def compute_and_store(self, key, compute):
+        value, cacheable = await compute()
+        if cacheable:
+            await self.aset(key, value)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "shared_in_flight": self.shared,
+            "abandoned": self.abandoned,
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk),
+            "ttl_seconds": self.ttl
+        }
+
+    def close(self):
+        self.disk.close()
+
+
+class DrugInfoCache(TieredCache):
+    """
+    Cache of the four recommendation fields of a drug, keyed by normalized drug name.
+    """
+    FIELDS = ("side_effects", "drug_purpose", "drug_consumption_pattern", "dietary_recommendation")
+
+    def __init__(self, cwd, config):
+        db_path = config.get("db_path", "cache/drug_cache.sqlite")
+        if not os.path.isabs(db_path):
+            db_path = os.path.join(cwd, db_path)
+        super().__init__(
+            db_path=db_path,
+            table="drug_info",
+            ttl=config.get("ttl_seconds", 7 * 24 * 3600),
+            max_memory_entries=config.get("max_memory_entries", 512),
+            max_disk_entries=config.get("max_disk_entries", 10000)
+        )
+
+    @staticmethod
+    def normalize_key(drug_name):
+        if not drug_name:
+            return ""
+        return " ".join(str(drug_name).lower().split())
+
+
+class DocumentCache(TieredCache):
+    """
+    Content-addressed cache of parsed prescription PDFs, keyed by the SHA-256 of the raw bytes.
+    Holds the extract_text_and_tables output and, when ``cache_extract_info`` is set, the
+    extract_info LLM output for a given model and prompt version.
+    """
+    def __init__(self, cwd, config):
+        db_path = config.get("db_path", "cache/document_cache.sqlite")
+        if not os.path.isabs(db_path):
+            db_path = os.path.join(cwd, db_path)
+        super().__init__(
+            db_path=db_path,
+            table="documents",
+            ttl=config.get("ttl_seconds", 30 * 24 * 3600),
+            max_memory_entries=config.get("max_memory_entries", 128),
+            max_disk_entries=config.get("max_disk_entries", 5000)
+        )
+        self.cache_extract_info = config.get("cache_extract_info", True)
+
+    @staticmethod
+    def text_key(hash_code):
+        return f"text:{hash_code}"
+
+    @staticmethod
+    def extract_key(hash_code, prompt_version):
+        return f"extract_info:{prompt_version}:{hash_code}"
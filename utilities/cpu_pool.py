@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def run_batch(calls):
+    """
+    Runs a batch of ``(func, args)`` calls in one executor task. Each result is
+    (ok, result or exception, started_at wall time, execution seconds).
+    """
+    results = []
+    for func, args in calls:
+        started_at = time.time()
+        start_time = time.perf_counter()
+        try:
+            results.append((True, func(*args), started_at, time.perf_counter() - start_time))
+        except Exception as e:
+            results.append((False, e, started_at, time.perf_counter() - start_time))
+    return results
+
+
+def preload_modules(module_names):
+    for module_name in module_names:
+        importlib.import_module(module_name)
+
+
+class PoolUnavailable(Exception):
+    pass
+
+
+class CPUTaskPool:
+    """
+    Runs pure-CPU text work (HTML parsing, cleaning, snippet matching) off the event loop.
+
+    - ``mode`` is "process" (spawned worker processes), "thread" or "inline".
+    - Calls smaller than ``inline_max_size`` run inline: for a small page the IPC costs more than the work.
+    - Larger calls are queued and sent in batches, a batch is flushed after ``batch_wait_ms``
+      or once it holds ``batch_max_size`` worth of input.
+    - If the pool breaks, the call falls back to running inline.
+
+    Functions and arguments must be picklable, i.e. module-level functions.
+    """
+    def __init__(
+        self,
+        mode="process",
+        max_workers=None,
+        inline_max_size=20000,
+        batch_max_size=200000,
+        batch_wait_ms=2.0,
+        preload=()
+    ):
+        if mode not in ("process", "thread", "inline"):
+            print(f"Custom Error: func(CPUTaskPool) - Unknown mode {mode}, running inline")
+            mode = "inline"
+        self.mode = mode
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.inline_max_size = inline_max_size
+        self.batch_max_size = batch_max_size
+        self.batch_wait_ms = batch_wait_ms
+        self.preload = tuple(preload)
+
+        self.executor = None
+        self.pending = []
+        self.pending_size = 0
+        self.flush_handle = None
+
+        self.inline_calls = 0
+        self.offloaded_calls = 0
+        self.batches = 0
+        self.fallbacks = 0
+        self.queue_wait = {"total_ms": 0.0, "max_ms": 0.0}
+        self.execution = {"total_ms": 0.0, "max_ms": 0.0}
+
+    def get_executor(self):
+        if self.executor is None:
+            if self.mode == "process":
+                # Spawned, not forked: the app process holds threads and open sockets
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=preload_modules,
+                    initargs=(self.preload,)
+                )
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cpu-pool")
+        return self.executor
+
+    async def start(self):
+        """Spawns the workers up front so the first pages do not wait for process start-up."""
+        if self.mode == "inline":
+            return
+        loop = asyncio.get_running_loop()
+        executor = self.get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, run_batch, []) for _ in range(self.max_workers)))
+        print(f"CPU Task Pool started (mode={self.mode}, max_workers={self.max_workers})")
+
+    def record(self, metric, seconds):
+        elapsed_ms = seconds * 1000
+        metric["total_ms"] += elapsed_ms
+        metric["max_ms"] = max(metric["max_ms"], elapsed_ms)
+
+    def run_inline(self, func, args):
+        start_time = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.inline_calls += 1
+            self.record(self.execution, time.perf_counter() - start_time)
+
+    async def run(self, func, *args, size=0):
+        """Returns ``func(*args)``; ``size`` (e.g. characters of input) decides inline vs offloaded."""
+        if self.mode == "inline" or size < self.inline_max_size:
+            return self.run_inline(func, args)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((func, args, future, time.time()))
+        self.pending_size += size
+        if self.pending_size >= self.batch_max_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.batch_wait_ms / 1000, self.flush)
+        try:
+            return await future
+        except PoolUnavailable as e:
+            print(f"Custom Error: func(CPUTaskPool.run) - {e}, running inline")
+            self.fallbacks += 1
+            return self.run_inline(func, args)
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending, self.pending_size = self.pending, [], 0
+        if not batch:
+            return
+        self.batches += 1
+        calls = [(func, args) for func, args, _, _ in batch]
+        try:
+            task = asyncio.get_running_loop().run_in_executor(self.get_executor(), run_batch, calls)
+        except Exception as e:
+            self.fail(batch, e)
+            return
+        task.add_done_callback(lambda done: self.deliver(batch, done))
+
+    def fail(self, batch, error):
+        # A broken pool is shut down so its workers do not leak, and rebuilt on the next batch
+        self.shutdown()
+        for _, _, future, _ in batch:
+            if not future.done():
+                future.set_exception(PoolUnavailable(repr(error)))
+
+    def deliver(self, batch, done):
+        if done.cancelled() or done.exception() is not None:
+            self.fail(batch, done.exception() if not done.cancelled() else "batch cancelled")
+            return
+        for (_, _, future, queued_at), (ok, result, started_at, seconds) in zip(batch, done.result()):
+            self.offloaded_calls += 1
+            self.record(self.queue_wait, max(started_at - queued_at, 0.0))
+            self.record(self.execution, seconds)
+            if future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    def stats(self):
+        calls = self.inline_calls + self.offloaded_calls
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "inline_calls": self.inline_calls,
+            "offloaded_calls": self.offloaded_calls,
+            "batches": self.batches,
+            "avg_batch_size": round(self.offloaded_calls / self.batches, 2) if self.batches else 0.0,
+            "fallbacks": self.fallbacks,
+            "queue_wait_ms": {
+                "avg": round(self.queue_wait["total_ms"] / self.offloaded_calls, 3) if self.offloaded_calls else 0.0,
+                "max": round(self.queue_wait["max_ms"], 3)
+            },
+            "execution_ms": {
+                "avg": round(self.execution["total_ms"] / calls, 3) if calls else 0.0,
+                "max": round(self.execution["max_ms"], 3)
+            }
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,104 @@
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+
+class JobManager:
+    """
+    In-process job queue drained by a fixed pool of worker coroutines.
+    The pool size caps how many pipelines run at once; finished jobs are kept
+    for polling until ``max_finished_jobs`` newer ones push them out.
+    """
+    def __init__(self, handler, num_workers=4, max_queue_size=100, max_finished_jobs=1000):
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.max_finished_jobs = max_finished_jobs
+
+        self.queue = None
+        self.workers = []
+        self.jobs = OrderedDict()
+        self.finished_jobs = OrderedDict()
+
+    async def start(self):
+        if self.workers:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.workers = [asyncio.create_task(self.worker_loop(idx)) for idx in range(self.num_workers)]
+        print(f"Job Manager started with {self.num_workers} workers")
+
+    async def stop(self):
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        print("Job Manager stopped")
+
+    def submit(self, payload):
+        if self.queue is None:
+            raise HTTPException(status_code=503, detail="Job workers are not running")
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        try:
+            self.queue.put_nowait((job_id, payload))
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="Job queue is full, retry later")
+        self.jobs[job_id] = job
+        return job
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id) or self.finished_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    def stats(self):
+        statuses = [job["status"] for job in self.jobs.values()]
+        return {
+            "workers": len(self.workers),
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "finished": len(self.finished_jobs),
+            "queue_capacity": self.max_queue_size
+        }
+
+    async def worker_loop(self, worker_idx):
+        while True:
+            job_id, payload = await self.queue.get()
+            job = self.jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            try:
+                job["result"] = await self.handler(payload)
+                job["status"] = "completed"
+            except asyncio.CancelledError:
+                job["status"] = "failed"
+                job["error"] = "Job cancelled during shutdown"
+                raise
+            except HTTPException as e:
+                job["status"] = "failed"
+                job["error"] = e.detail
+            except Exception as e:
+                print(f"Custom Exception func(worker_loop) worker {worker_idx}: {e}")
+                job["status"] = "failed"
+                job["error"] = str(e)
+            finally:
+                job["finished_at"] = time.time()
+                self.finish(job_id)
+                self.queue.task_done()
+
+    def finish(self, job_id):
+        self.finished_jobs[job_id] = self.jobs.pop(job_id)
+        while len(self.finished_jobs) > self.max_finished_jobs:
+            self.finished_jobs.popitem(last=False)
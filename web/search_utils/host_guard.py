@@ -0,0 +1,69 @@
+import time
+
+from utilities.async_utils import StageLimiter
+
+
+class HostGuard:
+    """
+    Per-host concurrency caps and a circuit breaker for the scraper.
+
+    - At most ``max_per_host`` pages of one host are fetched at a time (0 = unlimited).
+    - After ``failure_threshold`` consecutive timeouts or errors the host is skipped for
+      ``cooldown_seconds``. Then a single trial request is let through: a success closes
+      the circuit, another failure opens it for a new cooldown.
+    """
+    def __init__(self, max_per_host=4, failure_threshold=3, cooldown_seconds=60.0):
+        self.max_per_host = max_per_host
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        # Host names are bounded by the configured search sites
+        self.limits = StageLimiter()
+        self.hosts = {}
+
+    def state(self, host):
+        if host not in self.hosts:
+            self.limits.limits[host] = self.max_per_host
+            self.hosts[host] = {"failures": 0, "opened_at": None, "trial_at": None, "skipped": 0, "trips": 0}
+        return self.hosts[host]
+
+    def limit(self, host):
+        self.state(host)
+        return self.limits(host)
+
+    def allow(self, host):
+        state = self.state(host)
+        if state["opened_at"] is None:
+            return True
+        now = time.monotonic()
+        # Half-open: one trial per cooldown, a cancelled trial does not block the host forever
+        if now - state["opened_at"] >= self.cooldown_seconds and (state["trial_at"] is None or now - state["trial_at"] >= self.cooldown_seconds):
+            state["trial_at"] = now
+            return True
+        state["skipped"] += 1
+        return False
+
+    def record_success(self, host):
+        state = self.state(host)
+        state["failures"] = 0
+        state["opened_at"] = None
+        state["trial_at"] = None
+
+    def record_failure(self, host):
+        state = self.state(host)
+        state["failures"] += 1
+        state["trial_at"] = None
+        if state["failures"] >= self.failure_threshold:
+            if state["opened_at"] is None:
+                print(f"Circuit opened for {host} after {state['failures']} consecutive failures")
+                state["trips"] += 1
+            state["opened_at"] = time.monotonic()
+
+    def stats(self):
+        return {
+            host: {
+                "open": state["opened_at"] is not None,
+                "consecutive_failures": state["failures"],
+                "trips": state["trips"],
+                "skipped": state["skipped"]
+            } for host, state in self.hosts.items()
+        }
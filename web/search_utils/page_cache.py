@@ -0,0 +1,115 @@
+import time
+import asyncio
+
+from utilities.cache_utils import TTLCache
+
+
+class PageCache:
+    """
+    Cache of cleaned page text in front of the scraper.
+
+    - Single-flight: concurrent requests for one URL share one download.
+    - Bounded LRU of cleaned text; entries are fresh for ``ttl`` seconds.
+    - Stale entries are revalidated with If-None-Match / If-Modified-Since, a 304
+      keeps the cached text without downloading or parsing the page again.
+    - A download is cancelled once every caller waiting on it has been cancelled.
+    """
+    def __init__(self, max_entries=512, ttl=3600):
+        self.ttl = ttl
+        # Freshness is tracked per entry, stale entries are kept for revalidation
+        self.entries = TTLCache(max_entries=max_entries, ttl=0)
+        self.in_flight = {}
+        self.waiters = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.revalidated = 0
+        self.abandoned = 0
+
+    def configure(self, max_entries=None, ttl=None):
+        if max_entries is not None:
+            self.entries.max_entries = max_entries
+        if ttl is not None:
+            self.ttl = ttl
+
+    async def get_or_fetch(self, url, fetch):
+        """
+        ``fetch(url, validators)`` returns None on failure, {"not_modified": True} on a 304
+        or {"text", "etag", "last_modified", "cacheable"} for a downloaded page.
+        """
+        entry = self.entries.get(url)
+        if entry is not None and entry["expires_at"] > time.time():
+            self.hits += 1
+            return entry["text"]
+
+        future = self.in_flight.get(url)
+        if future is not None:
+            self.shared += 1
+        else:
+            future = asyncio.ensure_future(self.refresh(url, entry, fetch))
+            self.in_flight[url] = future
+            future.add_done_callback(lambda done: self.forget(url, done))
+        # Shielded so a cancelled caller does not cancel the download other callers wait on
+        self.waiters[url] = self.waiters.get(url, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self.waiters[url] == 1 and not future.done():
+                self.abandoned += 1
+                future.cancel()
+                self.forget(url, future)
+            raise
+        finally:
+            self.waiters[url] -= 1
+            if not self.waiters[url]:
+                del self.waiters[url]
+
+    def forget(self, url, future):
+        # Only drop the entry if a newer download has not replaced it
+        if self.in_flight.get(url) is future:
+            del self.in_flight[url]
+
+    async def refresh(self, url, entry, fetch):
+        validators = {}
+        if entry is not None:
+            if entry["etag"]:
+                validators["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                validators["If-Modified-Since"] = entry["last_modified"]
+
+        page = await fetch(url, validators)
+        if page is None:
+            return entry["text"] if entry is not None else ""
+
+        if page.get("not_modified"):
+            if entry is None:
+                return ""
+            self.revalidated += 1
+            entry["expires_at"] = time.time() + self.ttl
+            self.entries.set(url, entry)
+            return entry["text"]
+
+        self.misses += 1
+        if page.get("cacheable"):
+            self.entries.set(url, {
+                "text": page["text"],
+                "etag": page.get("etag"),
+                "last_modified": page.get("last_modified"),
+                "expires_at": time.time() + self.ttl
+            })
+        return page["text"]
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.entries.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_in_flight": self.shared,
+            "revalidated": self.revalidated,
+            "abandoned": self.abandoned,
+            "ttl_seconds": self.ttl
+        }
+
+
+page_cache = PageCache()
@@ -1,104 +1,255 @@
 import re
 import math
+import codecs
 import difflib
+import functools
+import importlib.util
+from urllib.parse import urlsplit
 
-import httpx
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+
+from utilities.async_utils import http_clients
+from utilities.cpu_pool import CPUTaskPool
+from web.search_utils.page_cache import page_cache
+from web.search_utils.host_guard import HostGuard
+from web.search_utils.snippet_matcher import SnippetMatcher
+
+KEYWORD_PATTERN = re.compile(r"[a-z0-9]+")
+KEYWORD_PREFIX = 6
+KEYWORD_STOP_WORDS = frozenset(
+    "a an and are as at be by can do does for from how in is it of on or should the to what when which while who "
+    "why will with your you this that these those".split()
+)
+
+#############################################################################################
+#                                 TEXT NORMALIZATION
+#############################################################################################
+
+MOJIBAKE_REPLACEMENTS = {
+    "â\x80\x99": "'",
+    "â\x80\x9c": '"',
+    "â\x80\x9d": '"',
+    "â\x80\x93": '-',
+    "â\x80\x94": '--',
+    "â\x80\x98": "'",
+    "â\x80\x9a": ",",
+    "â\x80\x9e": '"',
+    "â\x80\xa0": ' ',
+    "â\x80\xa6": '...',
+    "Â\xa0": ' ',
+    "â\x80\x99s": "'s",
+    "â\x80\x90": '-',    # Hyphen
+    "â\x80\x91": '-',    # Non-breaking hyphen
+    "â\x80\x92": '-',    # Figure dash
+    "â\x80\xa2": '•'     # Bullet
+}
+# Alternatives keep the dict order, so like the old replace loop "â\x80\x99s" never wins over "â\x80\x99"
+MOJIBAKE_PATTERN = re.compile("|".join(re.escape(key) for key in MOJIBAKE_REPLACEMENTS))
+
+# The original whitespace rules, in order. They only ever touch whitespace starting at a
+# newline or a double tab, so they are applied to that part of each whitespace run instead of the whole page.
+LAYOUT_RULES = [
+    (re.compile(r'\n\s{2,}\n'), '\n'),
+    (re.compile(r'\n\t{2,}\n'), '\n'),
+    (re.compile(r'\n{2,}'), '\n'),
+    (re.compile(r'\t{2,}'), '\t'),
+    (re.compile(r'(\n\s*){2,}'), '\n\n')
+]
+# Every branch starts with a literal so the regex engine can skip ahead to candidates
+LAYOUT_PATTERN = re.compile(r'\n\s*|\t\t\s*|___+')
+MULTI_SPACE_PATTERN = re.compile(r'  +')
+# Encoding to ASCII with this handler turns each run of non-ASCII characters into one space
+codecs.register_error("scrape_space", lambda error: (' ', error.end))
+
+@functools.lru_cache(maxsize=1024)
+def normalize_whitespace_run(run):
+    for pattern, replacement in LAYOUT_RULES:
+        run = pattern.sub(replacement, run)
+    return run
+
+def normalize_layout(match):
+    run = match.group()
+    if run[0] == '_':
+        return '_'
+    return normalize_whitespace_run(run)
+
+# Run of spaces after a sentence end, as used by split_sentences and rfind_regex
+SENTENCE_BREAK_PATTERN = re.compile(r'(?<=[.!?]) +')
+SPACE_RUN_PATTERN = re.compile(r' +')
+
+# lxml builds the tree in C, html.parser is the pure-Python fallback
+PARSER_BACKEND = "lxml" if importlib.util.find_spec("lxml") is not None else "html.parser"
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
 
 class ScrapeWebText:
-    def __init__(self,):
+    def __init__(self, max_bytes=2 * 1024 * 1024, parser="auto", cpu_pool=None, host_guard=None):
         self.headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537'}
+        self.max_bytes = max_bytes
+        self.parser = PARSER_BACKEND if parser == "auto" else parser
+        self.cpu_pool = cpu_pool or CPUTaskPool(mode="inline")
+        self.host_guard = host_guard or HostGuard()
+        self.pages = 0
+        self.truncated = 0
+        self.skipped = 0
+        self.bytes_read = 0
     
     async def fetch_website_text(self, url: str) -> str:
-        html_response  = await self.search_api(request_url=url, headers=self.headers)
-        html_text = html_response.text
+        _, html_text = await self.fetch_html(url, headers=self.headers)
         # html_text = requests.get(url, headers=self.headers).text
-        soup = BeautifulSoup(html_text, 'html.parser')
+        return self.extract_paragraph_text(html_text) if html_text else ""
+
+    def extract_paragraph_text(self, html_text: str) -> str:
+        if self.parser == "lxml":
+            # Only <p> subtrees are built, the rest of the page is skipped by the parser
+            soup = BeautifulSoup(html_text, 'lxml', parse_only=SoupStrainer('p'))
+        else:
+            soup = BeautifulSoup(html_text, 'html.parser')
         paragraphs = soup.find_all('p')
         text = ""
         for p in paragraphs:
-            if len(p.text) >= 100:
-                if p.text.endswith('.') or p.text.endswith('!') or p.text.endswith('?'):
-                    text += p.text[:-1] + f"{p.text[-1]} "
+            paragraph = p.text
+            if len(paragraph) >= 100:
+                if paragraph.endswith('.') or paragraph.endswith('!') or paragraph.endswith('?'):
+                    text += paragraph[:-1] + f"{paragraph[-1]} "
                 else:
-                    text += p.text + "."
+                    text += paragraph + "."
         return text
 
+    def is_html(self, content_type):
+        # Pages without a Content-Type are parsed like before
+        if not content_type:
+            return True
+        return content_type.split(";")[0].strip().lower() in HTML_CONTENT_TYPES
+
+    def decode(self, body: bytes, encoding) -> str:
+        try:
+            return body.decode(encoding or "utf-8", errors="replace")
+        except LookupError:
+            return body.decode("utf-8", errors="replace")
+
+    async def fetch_html(self, url, headers):
+        """
+        Streams the page and stops reading once ``max_bytes`` are in, the prefix is parsed as is.
+        Non-HTML responses (PDFs, images, ...) are closed without reading the body.
+        Returns (response, html_text); html_text is None on a 304 and "" for skipped pages,
+        (None, None) when the request failed or the host's circuit is open.
+        """
+        host = urlsplit(url).netloc
+        if not self.host_guard.allow(host):
+            print(f"Skipping {url}, circuit open for {host}")
+            return None, None
+        try:
+            async with self.host_guard.limit(host):
+                response, html_text = await self.stream_html(url, headers)
+        except Exception as e:
+            print(f"Custom Exception func(fetch_html): {e!r}")
+            self.host_guard.record_failure(host)
+            return None, None
+        if response.status_code >= 500:
+            self.host_guard.record_failure(host)
+        else:
+            self.host_guard.record_success(host)
+        return response, html_text
+
+    async def stream_html(self, url, headers):
+        async with http_clients.stream('get', url, headers=headers, timeout=10.0) as response:
+            if response.status_code == 304:
+                return response, None
+            content_type = response.headers.get("Content-Type")
+            if not self.is_html(content_type):
+                self.skipped += 1
+                print(f"Skipping non-HTML page ({content_type}): {url}")
+                return response, ""
+
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body += chunk
+                if len(body) >= self.max_bytes:
+                    if len(body) > self.max_bytes:
+                        self.truncated += 1
+                        print(f"Page truncated at {self.max_bytes} bytes: {url}")
+                    del body[self.max_bytes:]
+                    break
+            self.pages += 1
+            self.bytes_read += len(body)
+            return response, self.decode(bytes(body), response.charset_encoding)
+
     async def search_api(self, request_url, headers):
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                search_response = await client.request(
-                    method='get',
-                    url=request_url,
-                    headers=headers
-                )
-                await client.aclose()
-                return search_response
+            search_response = await http_clients.request(
+                'get',
+                request_url,
+                headers=headers,
+                timeout=10.0
+            )
+            return search_response
         except Exception as e:
             print(f"Custom Exception func(search_api): {e}")
             return []
     
     def preprocess_text(self, text: str) -> str:
-        text = re.sub(r'\n\s{2,}\n', '\n',text)
-        text = re.sub(r'\n\t{2,}\n', '\n',text)
-        text = re.sub(r'\n{2,}', '\n',text)
-        text = re.sub(r'\t{2,}', '\t',text)
-        text = re.sub(r'(\n\s*){2,}', '\n\n', text)
-        text = re.sub(r'__{2,}', '_',text)
-        pattern = r'[^\x00-\x7F]'
-        text = re.sub(pattern, ' ', text)
-        text = re.sub(r' {2,}', ' ',text)
+        # Pass 1: newline, tab and underscore rules; pass 2: non-ASCII characters to spaces.
+        # Both are skipped when the page has nothing for them to do.
+        if '\n' in text or '\t\t' in text or '___' in text:
+            text = LAYOUT_PATTERN.sub(normalize_layout, text)
+        if not text.isascii():
+            text = text.encode('ascii', 'scrape_space').decode('ascii')
+        if '  ' in text:
+            text = MULTI_SPACE_PATTERN.sub(' ', text)
+        # clean_text only rewrites non-ASCII sequences, so all that is left of it here is the strip
         text = self.clean_text(text)
-        text = text.strip()
         return text
 
     def clean_text(self, text: str) -> str:
-        replacements = {
-            "â\x80\x99": "'",
-            "â\x80\x9c": '"',
-            "â\x80\x9d": '"',
-            "â\x80\x93": '-',
-            "â\x80\x94": '--',
-            "â\x80\x98": "'",
-            "â\x80\x9a": ",",
-            "â\x80\x9e": '"',
-            "â\x80\xa0": ' ',
-            "â\x80\xa6": '...',
-            "Â\xa0": ' ',
-            "â\x80\x99s": "'s",
-            "â\x80\x90": '-',    # Hyphen
-            "â\x80\x91": '-',    # Non-breaking hyphen
-            "â\x80\x92": '-',    # Figure dash
-            "â\x80\xa2": '•'     # Bullet
-        }
-        for key, value in replacements.items():
-            text = text.replace(key, value)
+        # Every mojibake sequence starts with a non-ASCII character
+        if not text.isascii():
+            text = MOJIBAKE_PATTERN.sub(lambda match: MOJIBAKE_REPLACEMENTS[match.group()], text)
         # text = re.sub(r'[^a-zA-Z0-9.,:!?\'"()\[\]{}<> ]', ' ', text) # Remove unwanted characters (preserve only alphanumeric, punctuation, and spaces)
         text = text.strip()
         return text
 
+    async def download_page(self, url: str, validators: dict):
+        html_response, html_text = await self.fetch_html(url, headers={**self.headers, **validators})
+        if html_response is None:
+            return None
+        if html_text is None:
+            return {"not_modified": True}
+        text = await self.cpu_pool.run(parse_page_text, html_text, self.parser, size=len(html_text)) if html_text else ""
+        return {
+            "text": text,
+            "etag": html_response.headers.get("ETag"),
+            "last_modified": html_response.headers.get("Last-Modified"),
+            "cacheable": html_response.status_code == 200
+        }
+
     async def execute_scrape(self, url: str) -> str:
-        raw_text = await self.fetch_website_text(url)
-        clean_text = self.preprocess_text(raw_text)
-        return clean_text
+        return await page_cache.get_or_fetch(url, self.download_page)
+
+    def stats(self):
+        return {
+            "parser": self.parser,
+            "max_bytes": self.max_bytes,
+            "pages": self.pages,
+            "truncated": self.truncated,
+            "skipped_non_html": self.skipped,
+            "bytes_read": self.bytes_read
+        }
     
 class CreateChunks:
-    def __init__(self,):
-        pass
+    def __init__(self, max_verified=None):
+        # Optional cap on difflib verifications per snippet, see SnippetMatcher
+        self.max_verified = max_verified
+
+    def split_sentences(self, text):
+        return SENTENCE_BREAK_PATTERN.split(text)
 
-    def similar_context_from_snippet(self, text, snippet, context_sentences=2, similarity_threshold=0.3):
+    def best_matching_sentence(self, sentences, snippet, similarity_threshold=0.3, matcher=None):
+        """Index and ratio of the first sentence with the highest similarity above the threshold."""
+        matcher = matcher or SnippetMatcher(sentences, max_verified=self.max_verified)
+        return matcher.best_match(snippet, similarity_threshold)
+
+    def context_window(self, sentences, snippet_index, context_sentences=2):
         char_thrshold = 1500
-        sentences = re.split(r'(?<=[.!?]) +', text)
-        snippet_sentence = None
-        max_similarity_ratio = 0
-        for sentence in sentences:
-            similarity_ratio = difflib.SequenceMatcher(None, snippet, sentence).ratio()
-            if similarity_ratio > similarity_threshold and similarity_ratio > max_similarity_ratio:
-                snippet_sentence = sentence
-                max_similarity_ratio = similarity_ratio
-        if snippet_sentence is None:
-            return snippet
-        snippet_index = sentences.index(snippet_sentence)
         context_start = max(0, snippet_index - context_sentences)
         context_end = min(len(sentences), snippet_index + context_sentences + 1)
         
@@ -112,58 +263,115 @@ class CreateChunks:
 
         return chunk_text
 
+    def similar_context_from_snippet(self, text, snippet, context_sentences=2, similarity_threshold=0.3, sentences=None):
+        sentences = self.split_sentences(text) if sentences is None else sentences
+        snippet_index, _ = self.best_matching_sentence(sentences, snippet, similarity_threshold)
+        if snippet_index is None:
+            return snippet
+        return self.context_window(sentences, snippet_index, context_sentences)
+
     def get_number_of_chunks(self, text, character_threshold):
         if len(text) <= character_threshold:
             return 1
-        else:
-            chunk_number = 1
-            while True:
-                div = math.ceil(len(text)/chunk_number)
-                if div <  character_threshold:
-                    break 
-                else:
-                    chunk_number += 1
-            return chunk_number
+        # Smallest n with ceil(len / n) < character_threshold
+        return max(2, math.ceil(len(text) / max(character_threshold - 1, 1)))
         
     def rfind_regex(self, text):
-        pattern = r'(?<=[.!?]) +'
-        matches = list(re.finditer(pattern, text))
+        matches = list(SENTENCE_BREAK_PATTERN.finditer(text))
         if matches:
             return matches[-1].end() - 1
         return -1
-    
-    def split_text_into_parts(self, text, num_parts, max_chunk_length):
-        chunk_length = math.ceil(len(text)/num_parts)
-        chunks = []
-        start_index = 0
-
-        remaining_text = text
-        for _ in range(num_parts - 1):
-            current_text = remaining_text[:max_chunk_length]
-            remaining_text = remaining_text[max_chunk_length:]
-
-            if len(remaining_text) == 0: # For the last
-                chunks.append(current_text.strip())
-                break
-
-            closest_ = self.rfind_regex(current_text)
-            if closest_ == -1:
-                closest_ = current_text.rfind('.') if current_text.rfind('.') != -1 else current_text.rfind(' ')
-                closest_ += 1
-
-            chunks.append(current_text[:closest_].strip())
-            remaining_text = current_text[closest_:] + remaining_text
-
-        return chunks
 
+    def iter_chunks(self, text, max_chunk_length):
+        """
+        Yields chunks of at most ``max_chunk_length`` characters, each cut after the last
+        sentence break in its window (else after the last '.' or space), the same cut
+        ``rfind_regex`` makes on the window. Breaks are searched backwards from the window
+        end in place, so no window or remainder is ever copied and each character is only
+        looked at a bounded number of times.
+        """
+        position = 0
+        while position + max_chunk_length < len(text):
+            window_end = position + max_chunk_length
+            # A break is a run of spaces after '.', '!' or '?', its punctuation must be inside the window
+            punctuation = max(text.rfind(". ", position, window_end), text.rfind("! ", position, window_end), text.rfind("? ", position, window_end))
+            if punctuation != -1:
+                run_end = SPACE_RUN_PATTERN.match(text, punctuation + 1, window_end).end()
+                closest_ = run_end - 1 - position
+            else:
+                closest_ = text.rfind('.', position, window_end)
+                closest_ = closest_ if closest_ != -1 else text.rfind(' ', position, window_end)
+                closest_ = closest_ + 1 - position if closest_ != -1 else 0
+            if closest_ <= 0:
+                # No break, period or space in the window at all: cut it at its full length
+                closest_ = max_chunk_length
+            yield text[position:position + closest_].strip()
+            position += closest_
+        yield text[position:].strip()
 
     def chunk_web_text(self, text):
         character_threshold = 1500
         chunk_number = self.get_number_of_chunks(text, character_threshold)
         if chunk_number == 1:
             return [text]
-        chunks = self.split_text_into_parts(text, chunk_number, character_threshold)
-        return chunks
+        return list(self.iter_chunks(text, character_threshold))
+
+#############################################################################################
+#                       CPU STAGES (module level so CPUTaskPool can pickle them)
+#############################################################################################
+
+def parse_page_text(html_text, parser="html.parser"):
+    scraper = ScrapeWebText(parser=parser)
+    return scraper.preprocess_text(scraper.extract_paragraph_text(html_text))
+
+def chunk_page_text(text):
+    return CreateChunks().chunk_web_text(text)
+
+def context_from_snippet(text, snippet, max_verified=None):
+    return CreateChunks(max_verified=max_verified).similar_context_from_snippet(text, snippet)
+
+def keyword_terms(text):
+    """Lower-cased content words of a keyword string, cut to at most KEYWORD_PREFIX characters."""
+    return list(dict.fromkeys(
+        word[:KEYWORD_PREFIX] for word in KEYWORD_PATTERN.findall(text.lower()) if word not in KEYWORD_STOP_WORDS
+    ))
+
+def sentence_terms(sentence):
+    """Every word of the sentence plus its 3 to KEYWORD_PREFIX character prefixes, so a term matches the words it starts."""
+    terms = set()
+    for word in KEYWORD_PATTERN.findall(sentence.lower()):
+        terms.add(word)
+        terms.update(word[:length] for length in range(3, min(len(word), KEYWORD_PREFIX) + 1))
+    return terms
+
+def dossier_page_matches(text, keywords, min_coverage=0.5):
+    """
+    For each keyword string (e.g. "metformin side effects"), ((coverage, ratio), context window)
+    of the best sentence on the page or None. Coverage is the share of the keyword terms the
+    sentence contains and must reach ``min_coverage``; among the sentences with the highest
+    coverage the one closest to the keyword string by difflib ratio wins.
+    """
+    chunker = CreateChunks()
+    sentences = chunker.split_sentences(text)
+    page_terms = [sentence_terms(sentence) for sentence in sentences]
+    matches = []
+    for keyword in keywords:
+        terms = keyword_terms(keyword)
+        best_index, best_score = None, None
+        if terms:
+            coverages = [sum(term in words for term in terms) / len(terms) for words in page_terms]
+            top_coverage = max(coverages, default=0.0)
+            if top_coverage >= min_coverage:
+                matcher = difflib.SequenceMatcher(None, keyword)
+                for index, coverage in enumerate(coverages):
+                    if coverage != top_coverage:
+                        continue
+                    matcher.set_seq2(sentences[index])
+                    score = (coverage, matcher.ratio())
+                    if best_score is None or score > best_score:
+                        best_index, best_score = index, score
+        matches.append(None if best_index is None else (best_score, chunker.context_window(sentences, best_index)))
+    return matches
 
 
 
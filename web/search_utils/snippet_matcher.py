@@ -0,0 +1,132 @@
+import difflib
+
+import numpy as np
+
+# Characters are bucketed into 128 ASCII bins plus one bin for everything else.
+# Merging characters into a bin can only raise the overlap, so the bound stays an upper bound.
+NUM_BINS = 129
+SHINGLE_SIZE = 3
+HASH_MODULUS = (1 << 31) - 1
+
+
+class SnippetMatcher:
+    """
+    Indexed replacement for scanning every sentence with ``difflib.SequenceMatcher``.
+
+    Built once per page with NumPy:
+    - character 3-gram shingles of every sentence, used to rank sentences against a
+      snippet by shingle containment and Dice overlap in one vectorized step;
+    - a character histogram of every sentence, whose overlap with the snippet is an upper
+      bound on ``SequenceMatcher.ratio()`` (the same bound as ``quick_ratio``).
+
+    For a snippet, the top ``num_candidates`` sentences by shingle overlap are verified with
+    the exact difflib ratio, then any other sentence whose upper bound can still beat the
+    best ratio is verified too, so the result is exactly the sentence the full difflib scan
+    picks. ``max_verified`` optionally caps the sentences verified per snippet, trading
+    exactness for speed on long pages; by default there is no cap.
+    """
+    def __init__(self, sentences, num_candidates=8, max_verified=None):
+        self.sentences = sentences
+        self.num_candidates = num_candidates
+        self.max_verified = max_verified
+        self.lengths = np.fromiter((len(sentence) for sentence in sentences), dtype=np.int64, count=len(sentences))
+
+        codes = self.char_codes("".join(sentences))
+        rows = np.repeat(np.arange(len(sentences), dtype=np.int64), self.lengths)
+        self.histograms = self.build_histograms(codes, rows, len(sentences))
+        self.shingle_rows, self.shingle_hashes, self.shingle_counts = self.build_shingles(codes, rows, len(sentences))
+
+        self.verified = 0
+        self.budget_exhausted = 0
+
+    @staticmethod
+    def char_codes(text):
+        return np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32).astype(np.int64)
+
+    @staticmethod
+    def shingle_hash(codes):
+        hashes = codes[:-2] * 1_000_003 + codes[1:-1]
+        return (hashes % HASH_MODULUS * 1_000_003 + codes[2:]) % HASH_MODULUS
+
+    @staticmethod
+    def build_histograms(codes, rows, num_sentences):
+        counts = np.bincount(rows * NUM_BINS + np.minimum(codes, NUM_BINS - 1), minlength=num_sentences * NUM_BINS)
+        return counts.reshape(num_sentences, NUM_BINS)
+
+    @classmethod
+    def build_shingles(cls, codes, rows, num_sentences):
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(num_sentences, dtype=np.int64)
+        if len(codes) < SHINGLE_SIZE:
+            return empty
+        # Only shingles that start and end inside the same sentence
+        same_sentence = rows[:-2] == rows[2:]
+        keys = np.sort((rows[:-2][same_sentence] << 32) | cls.shingle_hash(codes)[same_sentence])
+        # No sentence is long enough for a shingle
+        if keys.size == 0:
+            return empty
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        shingle_rows = keys >> 32
+        shingle_hashes = keys & 0xFFFFFFFF
+        return shingle_rows, shingle_hashes, np.bincount(shingle_rows, minlength=num_sentences)
+
+    def upper_bounds(self, snippet_codes):
+        snippet_histogram = np.bincount(np.minimum(snippet_codes, NUM_BINS - 1), minlength=NUM_BINS)
+        overlap = np.minimum(self.histograms, snippet_histogram).sum(axis=1)
+        total_length = self.lengths + len(snippet_codes)
+        bounds = np.ones(len(self.sentences), dtype=np.float64)
+        non_empty = total_length > 0
+        bounds[non_empty] = 2.0 * overlap[non_empty] / total_length[non_empty]
+        return bounds
+
+    def shingle_scores(self, snippet_codes):
+        if len(snippet_codes) < SHINGLE_SIZE or not len(self.shingle_hashes):
+            return np.zeros(len(self.sentences), dtype=np.float64)
+        snippet_hashes = np.unique(self.shingle_hash(snippet_codes))
+        shared = np.bincount(self.shingle_rows[np.isin(self.shingle_hashes, snippet_hashes)], minlength=len(self.sentences))
+        # Containment of the snippet in the sentence, ties broken towards the closer length
+        containment = shared / len(snippet_hashes)
+        dice = 2.0 * shared / np.maximum(self.shingle_counts + len(snippet_hashes), 1)
+        return containment + dice
+
+    def best_match(self, snippet, similarity_threshold=0.3):
+        """
+        Index and ratio of the first sentence with the highest ``SequenceMatcher(None, snippet, sentence).ratio()``
+        strictly above ``similarity_threshold``; (None, 0) when no sentence qualifies.
+        """
+        if not self.sentences:
+            return None, 0
+        snippet_codes = self.char_codes(snippet)
+        bounds = self.upper_bounds(snippet_codes)
+        candidates = np.argsort(-self.shingle_scores(snippet_codes), kind="stable")[:self.num_candidates]
+
+        matcher = difflib.SequenceMatcher(None, snippet)
+        best_index, best_ratio = None, 0
+        verified = np.zeros(len(self.sentences), dtype=bool)
+
+        def verify(index):
+            nonlocal best_index, best_ratio
+            verified[index] = True
+            self.verified += 1
+            matcher.set_seq2(self.sentences[index])
+            ratio = matcher.ratio()
+            if ratio > similarity_threshold and (ratio > best_ratio or (ratio == best_ratio and index < best_index)):
+                best_index, best_ratio = index, ratio
+
+        for index in candidates.tolist():
+            if bounds[index] > similarity_threshold:
+                verify(index)
+
+        # Any sentence whose bound can still reach the best ratio has to be checked
+        remaining = np.flatnonzero(~verified & (bounds > similarity_threshold) & (bounds >= best_ratio))
+        remaining = remaining[np.argsort(-bounds[remaining], kind="stable")]
+        budget = None if self.max_verified is None else self.max_verified - int(verified.sum())
+        for index in remaining.tolist():
+            if bounds[index] < best_ratio:
+                break
+            if budget is not None:
+                if budget <= 0:
+                    self.budget_exhausted += 1
+                    break
+                budget -= 1
+            verify(index)
+        return best_index, best_ratio
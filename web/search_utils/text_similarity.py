@@ -0,0 +1,135 @@
+import re
+import zlib
+import hashlib
+
+import numpy as np
+
+from utilities.async_utils import async_post_api
+from utilities.cache_utils import TTLCache
+from utilities.cpu_pool import CPUTaskPool
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be been but by can could do does for from had has have how i if in into is it its "
+    "may might more most no not of on or our should so such than that the their them then there these they "
+    "this those to was we were what when which while who why will with would you your".split()
+)
+
+
+class HashingEmbedder:
+    """
+    Offline default backend: signed feature hashing of word unigrams and bigrams with
+    sublinear term frequency and L2 normalization. No model download and no network, and
+    the same text always maps to the same vector in every process.
+    """
+    is_local = True
+
+    def __init__(self, dim=1024, bigrams=True):
+        self.dim = dim
+        self.bigrams = bigrams
+        self.name = f"hashing-{dim}{'-bigrams' if bigrams else ''}"
+
+    def features(self, text):
+        tokens = [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+        if self.bigrams:
+            tokens += [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+        return tokens
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self.features(text)
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in features), dtype=np.uint32, count=len(features))
+            # The top bit picks the sign so colliding features tend to cancel out
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+            matrix[row] = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return matrix
+
+
+class APIEmbedder:
+    """Embedding endpoint with an OpenAI-style request ({"input", "model"}) and response ({"data": [{"embedding"}]})."""
+    is_local = False
+
+    def __init__(self, url, model, api_key=None, batch_size=64):
+        self.url = url
+        self.model = model
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+        self.batch_size = batch_size
+        self.name = f"api-{model}"
+
+    async def aembed(self, texts):
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            response = await async_post_api(self.url, self.headers, data={"input": batch, "model": self.model})
+            if not response:
+                raise RuntimeError(f"embedding request failed for {len(batch)} texts")
+            rows += [item["embedding"] for item in sorted(response.json()["data"], key=lambda item: item["index"])]
+        matrix = np.asarray(rows, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return matrix
+
+
+def get_embedder(config=None):
+    config = dict(config or {})
+    backend = config.pop("backend", "hashing")
+    if backend == "api":
+        return APIEmbedder(url=config["url"], model=config["model"], api_key=config.get("api_key"), batch_size=config.get("batch_size", 64))
+    if backend != "hashing":
+        print(f"Custom Error: func(get_embedder) - Unknown embedding backend {backend}, using hashing")
+    return HashingEmbedder(dim=config.get("dim", 1024), bigrams=config.get("bigrams", True))
+
+
+class TextSimilarity:
+    """
+    Ranks chunks against a query by cosine similarity of normalized embeddings.
+    Embeddings are cached by a hash of the chunk text, only unseen chunks are embedded,
+    in one batch, and all chunks are scored with a single matrix-vector product.
+    """
+    def __init__(self, embedder, cpu_pool=None, cache_entries=8192, cache_ttl=24 * 3600):
+        self.embedder = embedder
+        self.cpu_pool = cpu_pool or CPUTaskPool(mode="inline")
+        self.cache = TTLCache(max_entries=cache_entries, ttl=cache_ttl)
+
+    def cache_key(self, text):
+        return (self.embedder.name, hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest())
+
+    async def embed(self, texts):
+        keys = [self.cache_key(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [idx for idx, vector in enumerate(vectors) if vector is None]
+        # Identical chunks are embedded once
+        unique = {}
+        for idx in missing:
+            unique.setdefault(keys[idx], texts[idx])
+        if unique:
+            batch = list(unique.values())
+            if self.embedder.is_local:
+                matrix = await self.cpu_pool.run(self.embedder.embed, batch, size=sum(len(text) for text in batch))
+            else:
+                matrix = await self.embedder.aembed(batch)
+            embedded = dict(zip(unique, matrix))
+            for key, vector in embedded.items():
+                self.cache.set(key, vector)
+            for idx in missing:
+                vectors[idx] = embedded[keys[idx]]
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    async def execute_text_similarity(self, query_text, chunks, top_k=5):
+        """Indices and cosine similarities of the ``top_k`` chunks closest to the query, best first."""
+        if not chunks:
+            return [], []
+        matrix = await self.embed([query_text] + list(chunks))
+        similarities = matrix[1:] @ matrix[0]
+        # Best first, ties go to the earlier chunk
+        top_k_indices = np.argsort(-similarities, kind="stable")[:top_k]
+        return top_k_indices.tolist(), [round(float(similarity), 4) for similarity in similarities[top_k_indices]]
+
+    def stats(self):
+        return dict(self.cache.stats(), backend=self.embedder.name)
@@ -1,49 +1,129 @@
 import json
 import httpx
 import asyncio
+from urllib.parse import urlsplit
 
-import pandas as pd
-
-from web.search_utils.scrape_data import ScrapeWebText, CreateChunks
+from web.search_utils.host_guard import HostGuard
+from web.search_utils.text_similarity import TextSimilarity, get_embedder
+from web.search_utils.scrape_data import (
+    ScrapeWebText,
+    chunk_page_text,
+    context_from_snippet,
+    dossier_page_matches
+)
 
 from utilities.timer import Timer
-from utilities.async_utils import async_get_api
+from utilities.async_utils import async_get_api, StageLimiter
+from utilities.cache_utils import TTLCache
+from utilities.cpu_pool import CPUTaskPool
 timer = Timer()
 
 
+class SearchResult:
+    """One Bing result; ``chunk`` is filled in once the page has been scraped and matched."""
+    __slots__ = ("name", "url", "published_date", "snippet", "chunk")
+
+    def __init__(self, name="", url="", published_date="", snippet="", chunk=""):
+        self.name = name
+        self.url = url
+        self.published_date = published_date
+        self.snippet = snippet
+        self.chunk = chunk
+
+    def with_chunk(self, chunk):
+        # Results are shared through the search cache, so they are never modified in place
+        return SearchResult(self.name, self.url, self.published_date, self.snippet, chunk)
+
+    def to_dict(self):
+        return {
+            'name': self.name, 
+            'url': self.url, 
+            'published_date': self.published_date,
+            'snippet': self.snippet, 
+            'chunk': self.chunk
+        }
+
+
 class BingSearchClient:
     def __init__(self, 
             subscription_key, 
             custom_config_id, 
             bing_url,
+            stage_limits=None,
+            search_cache=None,
+            scrape_config=None,
+            cpu_pool=None,
+            scrape_mode="gather",
+            scrape_budget=None,
+            host_guard=None,
+            ranking_mode="snippet",
+            embedding=None,
+            snippet_max_verified=None,
+            market="en-US",
         ):
         self.subscription_key = subscription_key
         self.custom_config_id = custom_config_id
         self.bing_url = bing_url
+        self.market = market
+        self.stage_limits = stage_limits or StageLimiter()
+        # Parsing, cleaning and snippet matching run here instead of on the event loop
+        self.cpu_pool = cpu_pool or CPUTaskPool(mode="inline")
+
+        # Post-processed results keyed by (query, sites, market), failures and empty results are cached briefly
+        search_cache = search_cache or {}
+        self.negative_ttl = search_cache.get("negative_ttl", 60)
+        self.search_cache = TTLCache(
+            max_entries=search_cache.get("max_entries", 1024),
+            ttl=search_cache.get("ttl", 6 * 3600)
+        )
+        # One scraper per client so the byte cap, host guard and counters are shared by every request
+        self.host_guard = HostGuard(**(host_guard or {}))
+        self.scraper = ScrapeWebText(**(scrape_config or {}), cpu_pool=self.cpu_pool, host_guard=self.host_guard)
+
+        # None keeps snippet matching exact, a number caps the sentences verified per snippet
+        self.snippet_max_verified = snippet_max_verified
+
+        # "gather" waits for every page, "budget" takes the first pages that finish before a deadline
+        scrape_budget = scrape_budget or {}
+        self.scrape_mode = scrape_mode
+        self.deadline_seconds = scrape_budget.get("deadline_seconds", 3.0)
+        self.extra_results = scrape_budget.get("extra_results", 2)
+        self.budget_stats = {"runs": 0, "deadline_hits": 0, "cancelled": 0}
+
+        # "snippet" takes the context around each page's Bing snippet, "embedding" ranks every chunk of every page
+        embedding = dict(embedding or {})
+        self.ranking_mode = ranking_mode
+        self.text_similarity = TextSimilarity(
+            get_embedder(embedding),
+            cpu_pool=self.cpu_pool,
+            cache_entries=embedding.get("cache_entries", 8192),
+            cache_ttl=embedding.get("cache_ttl", 24 * 3600)
+        )
 
     def postprocess_response(self, response):
-        empty_df = pd.DataFrame([], columns=['name', 'url', 'published_date', 'snippet', "text"])
         try:
             if response.status_code == 200:
                 response = json.loads(response.text)
                 response = response["webPages"]["value"]
-                website_response = [{
-                        "name": resp["name"] if "name" in resp else "",
-                        "url": resp["url"] if "url" in resp else "",
-                        "published_date": resp["datePublishedDisplayText"] if "datePublishedDisplayText" in resp else "",
-                        "snippet": resp["snippet"] if "snippet" in resp else "",
-                        "text": ""
-                    } for resp in response]
-                df = pd.DataFrame(website_response, columns=['name', 'url', 'published_date', 'snippet', "text"])
-                return df
+                return [SearchResult(
+                        name=resp.get("name", ""),
+                        url=resp.get("url", ""),
+                        published_date=resp.get("datePublishedDisplayText", ""),
+                        snippet=resp.get("snippet", "")
+                    ) for resp in response]
             else:
                 print(f"Custom Error: func(postprocess_response) - Request failed with status code: {response.status_code}")
-                return empty_df
+                return []
         except Exception as e:
             print(f"Custom Exception func(postprocess_response): {e}")
-            return empty_df
+            return []
 
     async def web_search(self, query_text, sites):
+        cache_key = (query_text, sites if isinstance(sites, str) else tuple(sites), self.market)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         if isinstance(sites, str):
             query = f"{query_text} site:{sites}"
         else:
@@ -51,68 +131,160 @@ class BingSearchClient:
         params = {
             "q": query,
             "customconfig": self.custom_config_id,
-            "mkt": "en-US"
+            "mkt": self.market
         }
         headers = {
             "Ocp-Apim-Subscription-Key": self.subscription_key
         }
         response = await async_get_api(request_url=self.bing_url, headers=headers, params=params)
         response = self.postprocess_response(response)
+        self.search_cache.set(cache_key, response, ttl=None if response else self.negative_ttl)
         return response
     
+    async def limited_scrape(self, url):
+        async with self.stage_limits("web_scrape"):
+            return await self.scraper.execute_scrape(url)
+
+    async def scrape_results(self, results, accept):
+        """
+        Scraped text per result, in order. In "budget" mode scraping stops once ``accept`` pages
+        with text are in or the deadline passes; the other scrapes are cancelled and their text
+        is None. Hosts still pending at the deadline count as timed out for the circuit breaker.
+        """
+        if self.scrape_mode != "budget":
+            return await asyncio.gather(*(self.limited_scrape(site_response.url) for site_response in results))
+
+        self.budget_stats["runs"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_seconds
+        tasks = {asyncio.create_task(self.limited_scrape(site_response.url)): idx for idx, site_response in enumerate(results)}
+        texts = [None] * len(results)
+        pending = set(tasks)
+        accepted = 0
+        try:
+            while pending and accepted < accept:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    texts[tasks[task]] = task.result() if task.exception() is None else ""
+                    accepted += bool(texts[tasks[task]])
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if pending and accepted < accept:
+            self.budget_stats["deadline_hits"] += 1
+            # One timeout per host and question, however many of its pages were pending
+            for host in {urlsplit(results[tasks[task]].url).netloc for task in pending}:
+                self.host_guard.record_failure(host)
+        self.budget_stats["cancelled"] += len(pending)
+        return texts
+
+    def select_pages(self, results, texts, top_k):
+        """The ``top_k`` results to answer from: pages with text first, kept in search rank order."""
+        ranked = sorted(range(len(results)), key=lambda idx: not texts[idx])
+        keep = sorted(ranked[:top_k])
+        return [results[idx] for idx in keep], [texts[idx] or "" for idx in keep]
+
+    async def execute_dossier(self, drug_name, questions, site_name, top_k=5, over_fetch=2, keywords=None, min_coverage=0.5):
+        """
+        Drug dossier mode: one broad search per drug, every result page is scraped and
+        sentence-split once, then each question picks its context windows from that
+        shared corpus by its keyword string (e.g. "<drug> side effects"; by default the
+        content words of the question). Returns {question: result} with the same records
+        as execute_retrieve.
+        """
+        try:
+            keywords = keywords or questions
+            dossier_query = f"{drug_name} side effects uses dosage diet"
+            with timer("RetrieveDossierSearch"):
+                async with self.stage_limits("web_search"):
+                    response = await self.web_search(dossier_query, site_name)
+            response = response[:top_k * over_fetch]
+            if not response:
+                return {question: [] for question in questions}
+
+            with timer("ScrapeDossier"):
+                scraped_texts = [text or "" for text in await self.scrape_results(response, accept=len(response))]
+
+            with timer("DossierContext"):
+                page_matches = await asyncio.gather(*(
+                    self.cpu_pool.run(dossier_page_matches, scraped_text, keywords, min_coverage, size=len(scraped_text))
+                    for scraped_text in scraped_texts
+                ))
+
+            results = {}
+            for question_index, question in enumerate(questions):
+                matches = []
+                for rank, (site_response, page_match) in enumerate(zip(response, page_matches)):
+                    match = page_match[question_index]
+                    if match is not None:
+                        matches.append((match[0], -rank, site_response, match[1]))
+                matches.sort(key=lambda match: (match[0], match[1]), reverse=True)
+                if matches:
+                    result = [site_response.with_chunk(chunk).to_dict() for _, _, site_response, chunk in matches[:top_k]]
+                else:
+                    # Nothing in the corpus matched, fall back to the search snippets
+                    result = [site_response.with_chunk(site_response.snippet).to_dict() for site_response in response[:top_k]]
+                results[question] = result
+            return results
+        except Exception as e:
+            print(f"Custom Exception (execute_dossier): {e}")
+            return {question: [] for question in questions}
+
+    async def rank_chunks(self, query_text, results, scraped_texts, top_k):
+        """Chunks every page (the snippet stands in for a page without text) and keeps the ``top_k`` closest chunks overall."""
+        with timer("ChunkingWebText"):
+            page_chunks = await asyncio.gather(*(
+                self.cpu_pool.run(chunk_page_text, scraped_text, size=len(scraped_text))
+                for scraped_text in scraped_texts
+            ))
+            site_chunks = []
+            for site_response, scraped_text, chunks in zip(results, scraped_texts, page_chunks):
+                chunks = [chunk for chunk in chunks if chunk] if scraped_text else [site_response.snippet]
+                site_chunks += [(site_response, chunk) for chunk in chunks]
+
+        with timer("RetreiveSimilarTexts"):
+            top_k_indices, top_k_similarities = await self.text_similarity.execute_text_similarity(
+                query_text, [chunk for _, chunk in site_chunks], top_k
+            )
+
+        with timer("ResponseFormat"):
+            result = []
+            for idx, score in zip(top_k_indices, top_k_similarities):
+                site_response, chunk = site_chunks[idx]
+                result.append(dict(site_response.with_chunk(chunk).to_dict(), score=score))
+        return result
+
     async def execute_retrieve(self, query_text, site_name, top_k=5):  
         try:
             with timer("RetrieveWebSearch"):
-                response = await self.web_search(query_text, site_name)
+                async with self.stage_limits("web_search"):
+                    response = await self.web_search(query_text, site_name)
             
-            response = response[:top_k]
+            # Over-fetch in budget mode so slow pages can be dropped
+            response = response[:top_k + self.extra_results] if self.scrape_mode == "budget" else response[:top_k]
             result = []
-            if not response.empty:
-                df_list = []
-                tasks = []
+            if response:
                 with timer("ScrapeWebSearch"):
-                    for _, site_response in response.iterrows():
-                        scrape_task = asyncio.create_task(ScrapeWebText().execute_scrape(site_response['url']))
-                        tasks.append(scrape_task)
-                    scraped_texts = await asyncio.gather(*tasks)
-                
-                with timer("SimilarContext"):
-                    for (_, site_response), scraped_text in zip(response.iterrows(), scraped_texts):
-                        chunked_text = CreateChunks().similar_context_from_snippet(scraped_text, site_response["snippet"])
-                        site_resp = {
-                            'name': site_response['name'], 
-                            'url': site_response['url'], 
-                            'published_date': site_response['published_date'],
-                            'snippet': site_response['snippet'], 
-                            'chunk': chunked_text
-                        }
-                        result.append(site_resp)
-                    result = result[:top_k]
-########################################## Chunking + Cosine 
-                # with timer("ChunkingWebText"):
-                #     for (_, site_response), scraped_text in zip(response.iterrows(), scraped_texts):
-                #         chunks = CreateChunks().chunk_web_text(scraped_text)
-                #         site_chunks = [{
-                #             'name': site_response['name'], 
-                #             'url': site_response['url'], 
-                #             'published_date': site_response['published_date'],
-                #             'snippet': site_response['snippet'], 
-                #             'chunk': chunk
-                #         } for chunk in chunks]
-                #         df_list += site_chunks
-
-                # with timer("RetreiveSimilarTexts"):
-                #     df = pd.DataFrame(pd.concat([pd.DataFrame(df_list)]))
-                #     chunked_text = df['chunk'].tolist()
-                #     similar_texts = TextSimilarity(self.embedding_api_endpoint, self.embedding_model_name)
-                #     top_k_indices, top_k_similarities = await similar_texts.execute_text_similarity(query_text, chunked_text, top_k)
+                    scraped_texts = await self.scrape_results(response, accept=top_k)
+                    response, scraped_texts = self.select_pages(response, scraped_texts, top_k)
                 
-                # with timer("ResponseFormat"):
-                #     df_top_k = df.loc[top_k_indices]
-                #     if len(df_top_k) == len(top_k_similarities):
-                #         df_top_k['score'] = top_k_similarities
-                #     result = df_top_k.to_dict(orient='records')
-########################################## End
+                if self.ranking_mode == "embedding":
+                    result = await self.rank_chunks(query_text, response, scraped_texts, top_k)
+                else:
+                    with timer("SimilarContext"):
+                        chunked_texts = await asyncio.gather(*(
+                            self.cpu_pool.run(context_from_snippet, scraped_text, site_response.snippet, self.snippet_max_verified, size=len(scraped_text))
+                            for site_response, scraped_text in zip(response, scraped_texts)
+                        ))
+                        for site_response, chunked_text in zip(response, chunked_texts):
+                            result.append(site_response.with_chunk(chunked_text).to_dict())
+                        result = result[:top_k]
             else:
                 result = []
             with timer("RetrieveReturn"):
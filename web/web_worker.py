@@ -3,9 +3,6 @@ import json
 import time
 import logging
 
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-
 from fastapi import (
     FastAPI, 
     APIRouter, 
@@ -19,6 +16,8 @@ from fastapi import (
 from fastapi.responses import StreamingResponse, JSONResponse
 
 from utilities.timer import Timer
+from utilities.async_utils import StageLimiter
+from utilities.cpu_pool import CPUTaskPool
 from utilities.utils import (
     load_configurations,
     calculate_time
@@ -29,6 +28,7 @@ from web.application_utils.configurations import (
 )
 from web.application_utils.schema_models import WebSearchModel
 from web.search_utils.web_search import BingSearchClient
+from web.search_utils.page_cache import page_cache
 
 timer = Timer()
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -36,23 +36,33 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 class WebWorker:
     def __init__(
         self,
-        cwd: str
+        cwd: str,
+        stage_limits: StageLimiter = None
     ):
 
-        self.lock = asyncio.Lock()
-        self.non_async_running = 0
-        self.executor = ThreadPoolExecutor()
-
         self.cwd = cwd
         self.configurations = load_configurations(cwd)
         self.init_worker()
 
         self.config = self.configurations["web_configurations"]
+        self.cpu_pool = CPUTaskPool(**self.config.get("cpu_pool", {}), preload=["web.search_utils.scrape_data"])
         self.search_client = BingSearchClient(
                 subscription_key= self.config["subscription_key"], 
                 custom_config_id= self.config["custom_config_id"], 
-                bing_url= self.config["bing_url"]
+                bing_url= self.config["bing_url"],
+                stage_limits= stage_limits or StageLimiter(),
+                search_cache= self.config.get("search_cache"),
+                scrape_config= self.config.get("scrape"),
+                cpu_pool= self.cpu_pool,
+                scrape_mode= self.config.get("scrape_mode", "gather"),
+                scrape_budget= self.config.get("scrape_budget"),
+                host_guard= self.config.get("host_guard"),
+                ranking_mode= self.config.get("ranking_mode", "snippet"),
+                embedding= self.config.get("embedding"),
+                snippet_max_verified= self.config.get("snippet_max_verified")
         )
+        page_cache.configure(**self.config.get("page_cache", {}))
+        self.dossier_mode = bool(self.config.get("dossier_mode", False))
 
     def init_worker(self):
         self.configurations = update_config_from_env(self.configurations)
@@ -74,6 +84,36 @@ class WebWorker:
         response = {"query": request.query_text, "site": request.sites, "response": result}
         return response
 
+    async def execute_dossier_retrieve(self, drug_name, questions, keywords=None, request: WebSearchModel = None):
+        request = request or WebSearchModel()
+        results = await self.search_client.execute_dossier(
+            drug_name=drug_name,
+            questions=questions,
+            site_name=request.sites,
+            top_k=request.top_k,
+            over_fetch=self.config.get("dossier_over_fetch", 2),
+            keywords=keywords,
+            min_coverage=self.config.get("dossier_min_coverage", 0.5)
+        )
+        return [{"query": question, "site": request.sites, "response": results[question]} for question in questions]
+
+    def stats(self):
+        return {
+            "pages": page_cache.stats(),
+            "scrape": self.search_client.scraper.stats(),
+            "scrape_budget": dict(self.search_client.budget_stats, mode=self.search_client.scrape_mode),
+            "hosts": self.search_client.host_guard.stats(),
+            "embeddings": self.search_client.text_similarity.stats(),
+            "search": self.search_client.search_cache.stats(),
+            "cpu_pool": self.cpu_pool.stats()
+        }
+
+    async def start(self):
+        await self.cpu_pool.start()
+
+    def close(self):
+        self.cpu_pool.shutdown()
+
     def chunks_and_urls(self, data):
         urls_string = "\nReference Links:\n" + "\n".join(item["url"] for item in data["response"])
         query_and_chunks = "Question: " + data["query"] + "?\nSnippets:" + " ".join(item["chunk"] for item in data["response"])